@@ -0,0 +1,315 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+bench_corpus.py  ─────────────────────────────────────────────────────────────
+Synthetic input generators for the benchmark suite (benchmark.py).
+
+Everything is deterministic for a given seed so timings are comparable
+between runs.
+
+Generators
+━━━━━━━━━━
+- make_design_workbook()   詳細設計書 .xlsx with ロジック / SQL定義 sheets
+                           (layout matches what extractor.py searches for)
+- make_kiyaku_pdf()        multi-page 規約書 PDF with header/footer lines,
+                           rule text and a table per page (no PDF library needed)
+- make_cobol_source()      large fixed-format COBOL program (cols 1-72)
+- make_chunk_set()         base85 chunk_NNN.txt files as read by match.py
+- make_rules()             rule_extended.json style rule list
+
+Requirements
+━━━━━━━━━━━━
+- pandas + openpyxl for make_design_workbook(); the rest is stdlib only.
+
+Usage
+━━━━━
+$ python bench_corpus.py out_dir --pages 300 --workbooks 3 --cobol-lines 20000
+"""
+from __future__ import annotations
+
+import argparse
+import base64
+import json
+import random
+from pathlib import Path
+from typing import Dict, List
+
+# ────────────────────────────────────────────────────────────────────────────
+# Shared vocabulary
+# ────────────────────────────────────────────────────────────────────────────
+RULE_PHRASES = [
+    "変数名は英大文字で記述すること。",
+    "IF文には必ずEND-IFを記述すること。",
+    "PERFORM文のネストは3階層までとすること。",
+    "作業領域の初期化はINITIALIZE文を使用すること。",
+    "COMPUTE文で桁あふれが発生する場合はON SIZE ERRORを記述すること。",
+    "GO TO文は使用しないこと。",
+    "段落名には処理内容を表す名称を付けること。",
+    "ファイルのOPEN/CLOSEは同一段落内で行うこと。",
+    "EVALUATE文にはWHEN OTHERを記述すること。",
+    "定数はWORKING-STORAGE SECTIONで定義すること。",
+]
+CHAPTERS = ["1.1", "1.2", "2.1", "2.2", "3.1", "3.2", "4.1"]
+CATEGORIES = ["Naming", "Instruction", "Control Statement", "Data Definition", "File I/O"]
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# 詳細設計書 workbook
+# ────────────────────────────────────────────────────────────────────────────
+
+def _logic_sheet(rng: random.Random, n_logic_lines: int) -> List[List]:
+    """Rows for a ロジック sheet: 名称/概要 labels, 処理ロジック詳細 block in col 1,
+    terminated by the first value in col 2 (extractor.py slices up to it)."""
+    width = 8
+    rows = [[None] * width for _ in range(6 + n_logic_lines + 2)]
+    rows[1][1], rows[1][2] = "名称", f"ロジック{rng.randint(1, 999):03d}"
+    rows[2][1], rows[2][2] = "概要", "入力ファイルを読み込み、集計結果を出力する。"
+    rows[4][1] = "処理ロジック詳細"
+    for i in range(n_logic_lines):
+        sql = f" SQL-{rng.randint(1, 50):03d}を実行する。" if rng.random() < 0.2 else ""
+        rows[5 + i][1] = f"{i + 1}. {rng.choice(RULE_PHRASES)}{sql}"
+    rows[5 + n_logic_lines][2] = "以上"
+    return rows
+
+
+def _sql_sheet(rng: random.Random, n_sql_lines: int) -> List[List]:
+    """Rows for a SQL定義 sheet: SQL-ID / 操作 values 5 columns right of the label,
+    使用目的 on the following row, 論理SQL block below."""
+    width = 12
+    rows = [[None] * width for _ in range(8 + n_sql_lines)]
+    rows[1][1], rows[1][6] = "SQL-ID", f"SQL-{rng.randint(1, 50):03d}"
+    rows[2][1] = "使用目的"
+    rows[3][1] = "顧客マスタから有効な顧客を取得する。"
+    rows[4][1], rows[4][6] = "操作", rng.choice(["SELECT", "UPDATE", "INSERT", "DELETE"])
+    rows[6][1] = "論理SQL"
+    for i in range(n_sql_lines):
+        rows[7 + i][1] = f"  AND COL_{i:03d} = :HV-COL-{i:03d}" if i else "SELECT * FROM CUSTOMER WHERE 1 = 1"
+    return rows
+
+
+def make_design_workbook(path: Path, seed: int = 0, logic_sheets: int = 10,
+                         sql_sheets: int = 10, lines_per_sheet: int = 60) -> Path:
+    """Write one 詳細設計書 workbook. ``path`` should contain an id such as
+    ``AB-C-001`` so extractor.py can recover the 処理ID from the file name."""
+    import pandas as pd
+
+    rng = random.Random(seed)
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+        pd.DataFrame([["表紙"]]).to_excel(writer, sheet_name="表紙", header=False, index=False)
+        for i in range(logic_sheets):
+            pd.DataFrame(_logic_sheet(rng, lines_per_sheet)).to_excel(
+                writer, sheet_name=f"ロジック{i + 1}", header=False, index=False)
+        for i in range(sql_sheets):
+            pd.DataFrame(_sql_sheet(rng, lines_per_sheet)).to_excel(
+                writer, sheet_name=f"SQL定義{i + 1}", header=False, index=False)
+    return path
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# 規約書 PDF (hand-written PDF, Japanese text via a non-embedded CID font)
+# ────────────────────────────────────────────────────────────────────────────
+
+def _pdf_text(s: str) -> str:
+    """Hex string for UniJIS-UCS2-H (UCS-2 big endian)."""
+    return "<" + s.encode("utf-16-be").hex().upper() + ">"
+
+
+def _page_stream(lines: List[str]) -> bytes:
+    ops = ["BT", "/F1 9 Tf", "11 TL", "40 800 Td"]
+    for ln in lines:
+        ops.append(f"{_pdf_text(ln)} Tj T*")
+    ops.append("ET")
+    return "\n".join(ops).encode("ascii")
+
+
+def kiyaku_page_lines(rng: random.Random, page_no: int, total: int, doc_no: str) -> List[str]:
+    """Text lines for one page: repeated header/footer plus rule body and a table."""
+    body = [
+        "営業秘密  E-COBOL コーディング規約書",
+        f"文書番号 {doc_no}   版数 3.2   発行日 2024/04/01",
+        f"第{page_no // 10 + 1}章 規約 {page_no}",
+    ]
+    for k in range(rng.randint(4, 8)):
+        body.append(f"({k + 1}) {rng.choice(RULE_PHRASES)}")
+        if rng.random() < 0.4:
+            body.append(f"    例: MOVE WK-AREA-{rng.randint(1, 99):02d} TO OUT-REC.")
+    body.append("| 項目 | 内容 |")
+    body.append(f"| 規約{page_no}-1 | {rng.choice(RULE_PHRASES)} |")
+    body.append(f"Copyright (C) NTT DATA CORPORATION   {page_no} / {total}")
+    return body
+
+
+def make_kiyaku_pdf(path: Path, pages: int = 300, seed: int = 0, doc_no: str = "STD-0001") -> Path:
+    """Write a ``pages``-page 規約書 PDF. Each page repeats the same header and
+    footer lines (with the page number varying), like the real standards docs."""
+    rng = random.Random(seed)
+    objs: Dict[int, bytes] = {}
+    # 1 catalog, 2 pages, 3 font, 4 descendant font, then (content, page) pairs
+    objs[3] = (b"<< /Type /Font /Subtype /Type0 /BaseFont /HeiseiKakuGo-W5 "
+               b"/Encoding /UniJIS-UCS2-H /DescendantFonts [4 0 R] >>")
+    objs[4] = (b"<< /Type /Font /Subtype /CIDFontType0 /BaseFont /HeiseiKakuGo-W5 "
+               b"/CIDSystemInfo << /Registry (Adobe) /Ordering (Japan1) /Supplement 5 >> "
+               b"/FontDescriptor << /Type /FontDescriptor /FontName /HeiseiKakuGo-W5 /Flags 4 "
+               b"/FontBBox [-92 -250 1010 922] /ItalicAngle 0 /Ascent 880 /Descent -120 "
+               b"/CapHeight 737 /StemV 69 >> /DW 1000 >>")
+    kids = []
+    for p in range(1, pages + 1):
+        content_id, page_id = 3 + 2 * p, 4 + 2 * p
+        stream = _page_stream(kiyaku_page_lines(rng, p, pages, doc_no))
+        objs[content_id] = b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"
+        objs[page_id] = (b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                         b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id)
+        kids.append(page_id)
+    objs[1] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objs[2] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        " ".join(f"{k} 0 R" for k in kids).encode("ascii"), len(kids))
+
+    out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = {}
+    for oid in sorted(objs):
+        offsets[oid] = len(out)
+        out += b"%d 0 obj\n" % oid + objs[oid] + b"\nendobj\n"
+    xref = len(out)
+    n = max(objs) + 1
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % n
+    for oid in range(1, n):
+        out += b"%010d 00000 n \n" % offsets[oid]
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (n, xref)
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(bytes(out))
+    return path
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Fixed-format COBOL
+# ────────────────────────────────────────────────────────────────────────────
+
+def _fixed(seq: int, text: str, area_a: bool = False, indent: int = 0) -> str:
+    """Columns 1-6 sequence, 7 indicator, 8-11 Area A, 12-72 Area B."""
+    col = 7 if area_a else 11 + indent
+    return (f"{seq:06d}" + " " * (col - 6) + text)[:72].ljust(72)
+
+
+def make_cobol_source(lines: int = 20000, seed: int = 0, program_id: str = "BENCH01") -> str:
+    """Return a COBOL program of roughly ``lines`` lines with nested IF/PERFORM
+    blocks in the PROCEDURE DIVISION."""
+    rng = random.Random(seed)
+    out: List[str] = []
+    seq = 0
+
+    def emit(text: str, area_a: bool = False, indent: int = 0) -> None:
+        nonlocal seq
+        seq += 10
+        out.append(_fixed(seq, text, area_a, indent))
+
+    emit("IDENTIFICATION DIVISION.", True)
+    emit(f"PROGRAM-ID. {program_id}.", True)
+    emit("DATA DIVISION.", True)
+    emit("WORKING-STORAGE SECTION.", True)
+    n_vars = max(10, lines // 50)
+    for i in range(n_vars):
+        emit(f"01 WK-AREA-{i:04d}      PIC 9(8) VALUE ZERO.", True)
+    emit("PROCEDURE DIVISION.", True)
+
+    para = 0
+    while len(out) < lines:
+        para += 1
+        emit(f"PARA-{para:05d}.", True)
+        depth = 0
+        for _ in range(rng.randint(10, 40)):
+            r = rng.random()
+            a, b = rng.randrange(n_vars), rng.randrange(n_vars)
+            if r < 0.2 and depth < 4:
+                emit(f"IF WK-AREA-{a:04d} > WK-AREA-{b:04d}", indent=3 * depth)
+                depth += 1
+            elif r < 0.3 and depth:
+                depth -= 1
+                emit("END-IF", indent=3 * depth)
+            elif r < 0.4:
+                emit(f"PERFORM PARA-{rng.randint(1, para):05d}", indent=3 * depth)
+            elif r < 0.5:
+                emit(f"COMPUTE WK-AREA-{a:04d} = WK-AREA-{b:04d} * 2", indent=3 * depth)
+            else:
+                emit(f"MOVE WK-AREA-{a:04d} TO WK-AREA-{b:04d}", indent=3 * depth)
+        while depth:
+            depth -= 1
+            emit("END-IF", indent=3 * depth)
+        emit("EXIT.", indent=0)
+    emit("STOP RUN.")
+    return "\n".join(out) + "\n"
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# base85 chunk set (match.py format: one base85 line per chunk_NNN.txt)
+# ────────────────────────────────────────────────────────────────────────────
+
+def make_chunk_set(out_dir: Path, total_bytes: int = 8 * 1024 * 1024,
+                   chunks: int = 80, seed: int = 0) -> bytes:
+    """Write ``chunks`` chunk files into ``out_dir``; return the original payload
+    so callers can verify reassembly."""
+    rng = random.Random(seed)
+    payload = rng.randbytes(total_bytes)
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    size = -(-total_bytes // chunks)
+    for i in range(chunks):
+        piece = payload[i * size:(i + 1) * size]
+        (out_dir / f"chunk_{i + 1:03}.txt").write_text(
+            base64.b85encode(piece).decode("ascii") + "\n", encoding="utf-8")
+    return payload
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Rules (rule_extended.json layout)
+# ────────────────────────────────────────────────────────────────────────────
+
+def make_rules(n: int = 500, seed: int = 0) -> List[Dict]:
+    rng = random.Random(seed)
+    rules = []
+    for i in range(1, n + 1):
+        phrase = rng.choice(RULE_PHRASES)
+        rules.append({
+            "id": str(i),
+            "chapter": CHAPTERS[(i - 1) * len(CHAPTERS) // n],
+            "category": rng.choice(CATEGORIES),
+            "check_id": "",
+            "rule_title": phrase.rstrip("。"),
+            "rule_text": phrase,
+            "example": f"MOVE WK-AREA-{i % 100:02d} TO OUT-REC." if rng.random() < 0.5 else "",
+        })
+    return rules
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# CLI
+# ────────────────────────────────────────────────────────────────────────────
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic benchmark inputs")
+    parser.add_argument("out_dir", type=Path)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--pages", type=int, default=300, help="規約書 PDF page count")
+    parser.add_argument("--workbooks", type=int, default=3)
+    parser.add_argument("--cobol-lines", type=int, default=20000)
+    parser.add_argument("--chunk-mb", type=int, default=8)
+    parser.add_argument("--rules", type=int, default=500)
+    args = parser.parse_args()
+
+    out = args.out_dir
+    out.mkdir(parents=True, exist_ok=True)
+    for i in range(args.workbooks):
+        make_design_workbook(out / f"AB-C-{i + 1:03d}_詳細設計書.xlsx", seed=args.seed + i)
+    make_kiyaku_pdf(out / "kiyaku.pdf", pages=args.pages, seed=args.seed)
+    (out / "main.cbl").write_text(make_cobol_source(args.cobol_lines, seed=args.seed), encoding="utf-8")
+    make_chunk_set(out / "chunks", total_bytes=args.chunk_mb * 1024 * 1024, seed=args.seed)
+    (out / "rule_extended.json").write_text(
+        json.dumps(make_rules(args.rules, seed=args.seed), ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"[✓] Synthetic corpus written to {out}")
+
+
+if __name__ == "__main__":
+    main()
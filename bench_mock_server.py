@@ -0,0 +1,280 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+bench_mock_server.py  ────────────────────────────────────────────────────────
+Local OpenAI-compatible stub server for offline runs and benchmarks.
+
+Endpoints
+━━━━━━━━━
+- POST /v1/chat/completions   (stream and non-stream; also /chat/completions)
+- POST /v1/embeddings         deterministic hash-based vectors
+- GET  /v1/models
+
+Replies are canned but shaped like what each tool expects:
+- review prompts (rules list + violation table) → "All rules satisfied."
+- summarizer prompts ("rule_text" + page marker) → JSON array of rules
+- tag_rules checklist prompts                   → first candidate id
+- indentation prompts ("line_number")           → JSON array of suggestions ([] by default)
+- anything else                                 → "All rules satisfied."
+
+Latency, time-to-first-token, error rate and truncated-reply rate are
+configurable so retries and parse failures can be exercised.
+
+Usage
+━━━━━
+$ python bench_mock_server.py --port 8765 --latency 0.2 --error-rate 0.05
+
+# new SDK (OpenAI())          : OPENAI_BASE_URL=http://127.0.0.1:8765/v1
+# legacy SDK (openai<1.0)     : openai.api_base = "http://127.0.0.1:8765/v1"
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+
+@dataclass
+class MockConfig:
+    latency: float = 0.0        # seconds before the reply (non-stream) / total (stream)
+    ttft: float = 0.0           # seconds before the first streamed chunk
+    error_rate: float = 0.0     # fraction of requests answered with an error
+    error_status: int = 429     # status code used for injected errors
+    truncate_rate: float = 0.0  # fraction of replies cut off mid-way
+    embed_dim: int = 256
+    rules_per_reply: int = 5
+    seed: int = 0
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Canned replies
+# ────────────────────────────────────────────────────────────────────────────
+
+def _prompt_text(messages: List[Dict]) -> str:
+    parts = []
+    for m in messages:
+        c = m.get("content")
+        if isinstance(c, str):
+            parts.append(c)
+        elif isinstance(c, list):
+            parts.extend(p.get("text", "") for p in c if isinstance(p, dict))
+    return "\n".join(parts)
+
+
+# review prompts quote rule fields too ("violated_rule_title"), so they are matched first
+REVIEW_MARKERS = ("【Rules List】", "violated_rule_title")
+PAGE_MARKER = re.compile(r"--- Page (\d+) ---")
+
+
+def canned_reply(prompt: str, cfg: MockConfig) -> str:
+    if any(m in prompt for m in REVIEW_MARKERS):
+        return "All rules satisfied."
+    if "rule_text" in prompt and PAGE_MARKER.search(prompt):
+        pages = [int(p) for p in PAGE_MARKER.findall(prompt)]
+        items = []
+        for i in range(cfg.rules_per_reply):
+            page = pages[i * len(pages) // cfg.rules_per_reply]
+            items.append({
+                "rule_title": f"規約{page}-{i + 1}",
+                "rule_text": f"ページ{page}の規約{i + 1}本文。",
+                "example": "",
+                "page": page,
+            })
+        return json.dumps(items, ensure_ascii=False)
+    if "Candidates:" in prompt:
+        m = re.search(r"^1\. (\S+):", prompt, flags=re.MULTILINE)
+        return m.group(1) if m else "NONE"
+    if "line_number" in prompt:
+        return "[]"
+    return "All rules satisfied."
+
+
+def fake_embedding(text: str, dim: int) -> List[float]:
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    rng = random.Random(digest)
+    return [rng.uniform(-1.0, 1.0) for _ in range(dim)]
+
+
+def _usage(prompt: str, reply: str) -> Dict[str, int]:
+    # rough 4-chars-per-token estimate; good enough for relative comparisons
+    p, c = max(1, len(prompt) // 4), max(1, len(reply) // 4)
+    return {"prompt_tokens": p, "completion_tokens": c, "total_tokens": p + c}
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# HTTP handler
+# ────────────────────────────────────────────────────────────────────────────
+
+class MockHandler(BaseHTTPRequestHandler):
+    cfg: MockConfig = MockConfig()
+    rng = random.Random(0)
+    rng_lock = threading.Lock()
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):  # keep benchmark output clean
+        pass
+
+    def _roll(self, rate: float) -> bool:
+        with self.rng_lock:
+            return self.rng.random() < rate
+
+    def _send_json(self, status: int, body: Dict) -> None:
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "mock", "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        req = json.loads(self.rfile.read(length) or b"{}")
+
+        if self._roll(self.cfg.error_rate):
+            time.sleep(self.cfg.latency)
+            self._send_json(self.cfg.error_status, {"error": {
+                "message": "injected error", "type": "rate_limit_error" if self.cfg.error_status == 429 else "server_error"}})
+            return
+
+        if self.path.rstrip("/").endswith("/embeddings"):
+            inputs = req.get("input", "")
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            time.sleep(self.cfg.latency)
+            self._send_json(200, {
+                "object": "list",
+                "model": req.get("model", "mock"),
+                "data": [{"object": "embedding", "index": i, "embedding": fake_embedding(t, self.cfg.embed_dim)}
+                         for i, t in enumerate(inputs)],
+                "usage": {"prompt_tokens": sum(len(t) // 4 for t in inputs), "total_tokens": sum(len(t) // 4 for t in inputs)},
+            })
+            return
+
+        if self.path.rstrip("/").endswith("/chat/completions"):
+            prompt = _prompt_text(req.get("messages", []))
+            reply = canned_reply(prompt, self.cfg)
+            finish = "stop"
+            if self._roll(self.cfg.truncate_rate):
+                reply, finish = reply[: max(1, len(reply) * 2 // 3)], "length"
+            if req.get("stream"):
+                self._stream(req, prompt, reply, finish)
+            else:
+                time.sleep(self.cfg.latency)
+                self._send_json(200, {
+                    "id": "chatcmpl-mock", "object": "chat.completion", "created": int(time.time()),
+                    "model": req.get("model", "mock"),
+                    "choices": [{"index": 0, "finish_reason": finish,
+                                 "message": {"role": "assistant", "content": reply}}],
+                    "usage": _usage(prompt, reply),
+                })
+            return
+
+        self._send_json(404, {"error": {"message": "not found"}})
+
+    def _stream(self, req: Dict, prompt: str, reply: str, finish: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def event(choices, usage=None):
+            body = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()),
+                    "model": req.get("model", "mock"), "choices": choices}
+            if usage is not None:
+                body["usage"] = usage
+            self.wfile.write(b"data: " + json.dumps(body, ensure_ascii=False).encode("utf-8") + b"\n\n")
+            self.wfile.flush()
+
+        time.sleep(self.cfg.ttft)
+        pieces = [reply[i:i + 16] for i in range(0, len(reply), 16)] or [""]
+        gap = max(0.0, self.cfg.latency - self.cfg.ttft) / len(pieces)
+        for i, piece in enumerate(pieces):
+            delta = {"content": piece} if i else {"role": "assistant", "content": piece}
+            event([{"index": 0, "delta": delta, "finish_reason": None}])
+            if gap:
+                time.sleep(gap)
+        event([{"index": 0, "delta": {}, "finish_reason": finish}])
+        if (req.get("stream_options") or {}).get("include_usage"):
+            event([], usage=_usage(prompt, reply))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# In-process start/stop (used by benchmark.py)
+# ────────────────────────────────────────────────────────────────────────────
+
+class MockServer:
+    """Run the stub server in a background thread.
+
+        with MockServer(MockConfig(latency=0.1)) as srv:
+            os.environ["OPENAI_BASE_URL"] = srv.base_url
+    """
+
+    def __init__(self, cfg: Optional[MockConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        cfg = cfg or MockConfig()
+        handler = type("BoundMockHandler", (MockHandler,), {"cfg": cfg, "rng": random.Random(cfg.seed)})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def __enter__(self) -> "MockServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# CLI
+# ────────────────────────────────────────────────────────────────────────────
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per reply")
+    parser.add_argument("--ttft", type=float, default=0.0, help="seconds to first streamed chunk")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=429)
+    parser.add_argument("--truncate-rate", type=float, default=0.0)
+    parser.add_argument("--rules-per-reply", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    cfg = MockConfig(latency=args.latency, ttft=args.ttft, error_rate=args.error_rate,
+                     error_status=args.error_status, truncate_rate=args.truncate_rate,
+                     rules_per_reply=args.rules_per_reply, seed=args.seed)
+    srv = MockServer(cfg, args.host, args.port)
+    print(f"[✓] Mock OpenAI server on {srv.base_url}  (Ctrl+C to stop)")
+    try:
+        srv.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
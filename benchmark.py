@@ -0,0 +1,476 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+benchmark.py  ────────────────────────────────────────────────────────────────
+Offline benchmark suite for the extraction / formatting / review scripts.
+
+Inputs come from bench_corpus.py (synthetic, seeded) and every model call
+goes to the local stub in bench_mock_server.py, so no API key or network
+access is needed.
+
+Cases
+━━━━━
+extractor            extractor.py over 詳細設計書 workbooks
+extract_text_by_page pdf_kiyaku.extract_text_by_page on a 規約書 PDF
+clean_pages          pdf_kiyaku.clean_extracted_pages on the extracted pages
+formatter            `formatter` procedure-scope reformatter on a large program
+apply_format_batches Agent_formatter diff application, one batch per block
+apply_indent         `indention` apply_indent_suggestions on every line
+chunk_reassembly     match.py base85 chunk → doc.7z reassembly
+summarize_e2e        pdf_kiyaku.summarize_batch against the mock server
+review_e2e           review_server.ReviewService.review (concurrent clients) against the mock server
+
+Cases whose dependencies are not installed are reported as "skip".
+
+Baselines
+━━━━━━━━━
+Best-of-N times (min_s, less sensitive to noise than the median) are
+compared with bench_baseline.json, which holds one set per size profile
+("full", "quick") so the --quick smoke run can be checked in CI too. A case
+slower than baseline × (1 + --tolerance) is flagged (unless the slowdown is
+under --min-delta seconds, i.e. timer noise) and the exit status is 1.
+The default tolerance is 0.25 for full runs and 0.5 for --quick, whose
+short timings are noisier. A fixed calibration workload is timed around
+every repeat; each baseline is scaled by how much faster or slower this
+machine is right then than when it was recorded, so a busy CI host (or
+one whose speed drifts during the run) does not show up as regressions. A case that raises is reported as
+"error" (and also fails the run) without stopping the remaining cases.
+
+Usage
+━━━━━
+$ python benchmark.py                       # run all, compare with baseline
+$ python benchmark.py --quick --only chunk  # small inputs, matching cases only
+$ python benchmark.py --save-baseline       # record current times as the baseline
+$ python benchmark.py --quick --save-baseline
+"""
+from __future__ import annotations
+
+import argparse
+import ast
+import contextlib
+import importlib.util
+import json
+import os
+import random
+import runpy
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from importlib.machinery import SourceFileLoader
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+os.environ.setdefault("LLM_METRICS", "0")  # keep traces out of timed runs
+
+import bench_corpus
+from bench_mock_server import MockConfig, MockServer
+
+REPO_DIR = Path(__file__).resolve().parent
+BASELINE_PATH = REPO_DIR / "bench_baseline.json"
+PROFILES = ("full", "quick")
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Helpers
+# ────────────────────────────────────────────────────────────────────────────
+
+def load_script(path: Path, name: Optional[str] = None, defs_only: bool = False,
+                extra_globals: Optional[Dict[str, Any]] = None):
+    """Import a repo script, including ones without a .py suffix.
+
+    With ``defs_only`` only imports, function/class definitions and constant
+    assignments are executed, so scripts with top-level side effects can still
+    be benchmarked; imports that fail are skipped.
+    """
+    path = REPO_DIR / path
+    name = name or path.name.replace(" ", "_").replace(".py", "")
+    if not defs_only:
+        loader = SourceFileLoader(name, str(path))
+        spec = importlib.util.spec_from_loader(name, loader)
+        module = importlib.util.module_from_spec(spec)
+        loader.exec_module(module)
+        return module
+
+    tree = ast.parse(path.read_text(encoding="utf-8"), filename=str(path))
+    ns: Dict[str, Any] = {"__name__": name, "__file__": str(path)}
+    ns.update(extra_globals or {})
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            with contextlib.suppress(ImportError):
+                exec(compile(ast.Module([node], []), str(path), "exec"), ns)
+        elif isinstance(node, (ast.FunctionDef, ast.ClassDef)) or (
+                isinstance(node, ast.Assign) and isinstance(node.value, ast.Constant)):
+            exec(compile(ast.Module([node], []), str(path), "exec"), ns)
+    return SimpleNamespace(**ns)
+
+
+@contextlib.contextmanager
+def chdir(path: Path):
+    old = Path.cwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(old)
+
+
+@contextlib.contextmanager
+def quiet():
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+@dataclass
+class Sizes:
+    workbooks: int = 3
+    pdf_pages: int = 300
+    cobol_lines: int = 20000
+    chunk_mb: int = 8
+    rules: int = 500
+    summarize_batches: int = 20
+    review_clients: int = 8
+
+    @classmethod
+    def quick(cls) -> "Sizes":
+        return cls(workbooks=1, pdf_pages=30, cobol_lines=2000, chunk_mb=1, rules=60, summarize_batches=4,
+                   review_clients=2)
+
+
+@dataclass
+class Context:
+    work: Path
+    sizes: Sizes
+    mock_url: str
+
+
+@dataclass
+class Case:
+    name: str
+    setup: Callable[[Context], Any]        # returns state passed to run(); raise ImportError to skip
+    run: Callable[[Any], int]              # returns number of work units processed
+    unit: str
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Cases
+# ────────────────────────────────────────────────────────────────────────────
+
+def _setup_extractor(ctx: Context):
+    import pandas  # noqa: F401
+    import openpyxl  # noqa: F401
+    d = ctx.work / "extractor"
+    for i in range(ctx.sizes.workbooks):
+        bench_corpus.make_design_workbook(d / f"AB-C-{i + 1:03d}_詳細設計書.xlsx", seed=i)
+    return d
+
+
+def _run_extractor(d: Path) -> int:
+    with chdir(d), quiet():
+        runpy.run_path(str(REPO_DIR / "extractor.py"), run_name="__main__")
+    return len(list(d.glob("*詳細設計書*.xlsx")))
+
+
+def _setup_extract(ctx: Context):
+    import pdf_kiyaku as mod
+    pdf = bench_corpus.make_kiyaku_pdf(ctx.work / "kiyaku.pdf", pages=ctx.sizes.pdf_pages)
+    return mod, pdf
+
+
+def _run_extract(state) -> int:
+    mod, pdf = state
+    return len(mod.extract_text_by_page(str(pdf)))
+
+
+def _setup_clean(ctx: Context):
+    mod, pdf = _setup_extract(ctx)
+    return mod, mod.extract_text_by_page(str(pdf))
+
+
+def _run_clean(state) -> int:
+    mod, pages = state
+    return len(mod.clean_extracted_pages(pages))
+
+
+def _unformatted_source(ctx: Context) -> str:
+    src = bench_corpus.make_cobol_source(ctx.sizes.cobol_lines)
+    return "\n".join(ln[6:].strip() for ln in src.splitlines())
+
+
+def _setup_formatter(ctx: Context):
+    import re
+    mod = load_script(Path("formatter"), defs_only=True, extra_globals={"re": re})
+    return mod.format_cobol_code_from_text_with_procedure_scope, _unformatted_source(ctx)
+
+
+def _run_formatter(state) -> int:
+    fn, code = state
+    return len(fn(code).splitlines())
+
+
+def _setup_format_batches(ctx: Context):
+    import Agent_formatter
+    lines = _unformatted_source(ctx).splitlines()
+    batches, block = [], []
+    for idx, ln in enumerate(lines):
+        block.append({"line": idx, "target_col": 12 if ln.startswith(("IF", "END-IF", "PERFORM")) else 15})
+        if ln.startswith("END-IF") or len(block) >= 20:
+            batches.append({"lines": block, "reason": "block"})
+            block = []
+    if block:
+        batches.append({"lines": block, "reason": "block"})
+    return Agent_formatter.apply_format_batches, lines, batches
+
+
+def _run_format_batches(state) -> int:
+    fn, lines, batches = state
+    fn(lines, batches)
+    return len(lines)
+
+
+def _setup_indent(ctx: Context):
+    mod = load_script(Path("indention"), defs_only=True)
+    lines = bench_corpus.make_cobol_source(ctx.sizes.cobol_lines).splitlines(keepends=True)
+    header, proc = mod.split_header_procedure(lines)
+    proc_json = mod.procedure_to_json(proc)
+    suggestions = [{"line_number": p["line_number"], "corrected_indent": 11, "reason": "x"} for p in proc_json]
+    return mod.apply_indent_suggestions, proc, suggestions
+
+
+def _run_indent(state) -> int:
+    fn, proc, suggestions = state
+    return len(fn(proc, suggestions))
+
+
+def _setup_chunks(ctx: Context):
+    d = ctx.work / "chunks"
+    payload = bench_corpus.make_chunk_set(d, total_bytes=ctx.sizes.chunk_mb * 1024 * 1024)
+    return d, payload
+
+
+def _run_chunks(state) -> int:
+    d, payload = state
+    with chdir(d), quiet():
+        runpy.run_path(str(REPO_DIR / "match.py"), run_name="__main__")
+    if (d / "doc.7z").read_bytes() != payload:
+        raise RuntimeError("reassembled payload differs from the original")
+    return len(payload) // (1024 * 1024)
+
+
+def _setup_summarize(ctx: Context):
+    import openai
+    import pdf_kiyaku as mod
+    mod.client = openai.OpenAI(api_key="mock", base_url=ctx.mock_url)
+    pages = [f"\n--- Page {p} ---\n" + "\n".join(bench_corpus.kiyaku_page_lines(
+        random.Random(p), p, 9999, "STD-0001")) for p in range(1, 5 * ctx.sizes.summarize_batches + 1)]
+    return mod, mod.batch_pages(pages, batch_size=5)
+
+
+def _run_summarize(state) -> int:
+    mod, batches = state
+    for batch in batches:
+        mod.summarize_batch(batch, "Extract rules as JSON with rule_title, rule_text, example.")
+    return len(batches)
+
+
+def _setup_review(ctx: Context):
+    import openai
+    import review_server
+    rules_path = ctx.work / "review" / "rule_extended.json"
+    rules_path.parent.mkdir(exist_ok=True)
+    rules_path.write_text(json.dumps(bench_corpus.make_rules(ctx.sizes.rules), ensure_ascii=False), encoding="utf-8")
+    svc = review_server.ReviewService(rules_path, client=openai.OpenAI(api_key="mock", base_url=ctx.mock_url))
+    sources = [bench_corpus.make_cobol_source(ctx.sizes.cobol_lines // 10, seed=i)
+               for i in range(ctx.sizes.review_clients)]
+    return review_server, svc, sources
+
+
+def _run_review(state) -> int:
+    review_server, svc, sources = state
+    # concurrent clients, so reviews of the same rule batch share model calls
+    with quiet():
+        reports = review_server.parallel(svc.review, sources)
+    return len(reports)
+
+
+CASES = [
+    Case("extractor", _setup_extractor, _run_extractor, "workbook"),
+    Case("extract_text_by_page", _setup_extract, _run_extract, "page"),
+    Case("clean_pages", _setup_clean, _run_clean, "page"),
+    Case("formatter", _setup_formatter, _run_formatter, "line"),
+    Case("apply_format_batches", _setup_format_batches, _run_format_batches, "line"),
+    Case("apply_indent", _setup_indent, _run_indent, "line"),
+    Case("chunk_reassembly", _setup_chunks, _run_chunks, "MiB"),
+    Case("summarize_e2e", _setup_summarize, _run_summarize, "batch"),
+    Case("review_e2e", _setup_review, _run_review, "review"),
+]
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Runner
+# ────────────────────────────────────────────────────────────────────────────
+
+def run_case(case: Case, ctx: Context, repeat: int) -> Dict[str, Any]:
+    try:
+        state = case.setup(ctx)
+    except ImportError as e:
+        return {"status": "skip", "reason": str(e)}
+    except Exception as e:
+        return {"status": "error", "reason": f"setup: {type(e).__name__}: {e}"}
+    times, calibs, units = [], [], 0
+    before = calibrate(2)
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        try:
+            units = case.run(state)
+        except Exception as e:
+            return {"status": "error", "reason": f"{type(e).__name__}: {e}"}
+        times.append(time.perf_counter() - t0)
+        # host speed drifts during a long run: bracket every repeat with calibrations
+        after = calibrate(2)
+        calibs.append((before + after) / 2)
+        before = after
+    median = statistics.median(times)
+    best = min(range(repeat), key=lambda i: times[i] / calibs[i])
+    return {"status": "ok", "median_s": median, "min_s": min(times), "units": units,
+            # calibration time such that min_s / calib_s is the best speed-normalised repeat
+            "calib_s": min(times) * calibs[best] / times[best],
+            "throughput": units / median if median else float("inf"), "unit": case.unit}
+
+
+CALIBRATION = "_calibration"
+
+
+def calibrate(repeat: int = 5) -> float:
+    """Best-of-N time of a fixed CPU + memory workload (hashing, base85, sorting)
+    used to normalise baselines for the current machine speed."""
+    import base64
+    import hashlib
+    data = random.Random(0).randbytes(1 << 18)
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        hashlib.sha256(base64.b85decode(base64.b85encode(data))).digest()
+        sorted(range(50000), key=lambda i: (i * 7919) % 50021)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def speed_factor(results: Dict[str, Dict], baseline: Dict[str, Dict]) -> float:
+    """Current calibration time / baseline calibration time (1.0 if unknown)."""
+    now, then = results.get(CALIBRATION, {}).get("min_s"), baseline.get(CALIBRATION, {}).get("min_s")
+    return now / then if now and then else 1.0
+
+
+def case_factor(r: Dict, base: Dict, factor: float) -> float:
+    """Speed factor measured around this case, falling back to the run-wide one."""
+    now, then = r.get("calib_s"), base.get("calib_s")
+    return now / then if now and then else factor
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float,
+            min_delta: float = 0.0) -> List[str]:
+    regressions = []
+    factor = speed_factor(results, baseline)
+    for name, r in results.items():
+        base = baseline.get(name)
+        if name == CALIBRATION or r["status"] != "ok" or not base:
+            continue
+        base_s = base.get("min_s", base.get("median_s")) * case_factor(r, base, factor)
+        if r["min_s"] > base_s * (1 + tolerance) and r["min_s"] - base_s > min_delta:
+            r["regression"] = r["min_s"] / base_s - 1
+            regressions.append(name)
+    return regressions
+
+
+def print_table(results: Dict[str, Dict], baseline: Dict[str, Dict]) -> None:
+    factor = speed_factor(results, baseline)
+    print(f"machine speed vs baseline: ×{factor:.2f} (baselines scaled accordingly)")
+    print(f"{'case':<22} {'min_s':>9} {'baseline':>9} {'delta':>7}  throughput")
+    print("─" * 72)
+    for name, r in results.items():
+        if name == CALIBRATION:
+            continue
+        if r["status"] != "ok":
+            print(f"{name:<22} {r['status']:>9}  {r['reason']}")
+            continue
+        case_base = baseline.get(name, {})
+        base = case_base.get("min_s", case_base.get("median_s"))
+        base = base * case_factor(r, case_base, factor) if base else base
+        delta = f"{r['min_s'] / base - 1:+.0%}" if base else "-"
+        flag = "  ⚠ REGRESSION" if "regression" in r else ""
+        base_s = f"{base:.4f}" if base else "-"
+        print(f"{name:<22} {r['min_s']:>9.4f} {base_s:>9} {delta:>7}  "
+              f"{r['throughput']:.1f} {r['unit']}/s{flag}")
+
+
+def load_baseline(path: Path, profile: str) -> Dict[str, Dict]:
+    """Baseline times for one size profile. A flat file (no profiles) is the full-size one."""
+    if not path.exists():
+        return {}
+    data = json.loads(path.read_text(encoding="utf-8"))
+    if not any(k in data for k in PROFILES):
+        data = {"full": data}
+    return data.get(profile, {})
+
+
+def save_baseline(path: Path, profile: str, results: Dict[str, Dict]) -> None:
+    data = {p: load_baseline(path, p) for p in PROFILES}
+    data[profile] = {**data[profile],
+                     **{k: {key: round(v[key], 6) for key in ("min_s", "median_s", "calib_s") if key in v}
+                        for k, v in results.items() if v["status"] == "ok"}}
+    path.write_text(json.dumps({p: v for p, v in data.items() if v}, indent=2, sort_keys=True) + "\n",
+                    encoding="utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the offline benchmark suite")
+    parser.add_argument("--only", nargs="*", default=None, help="substring filter on case names")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--quick", action="store_true", help="small inputs (smoke test)")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=None,
+                        help="allowed slowdown vs baseline (default 0.25, 0.5 with --quick)")
+    parser.add_argument("--min-delta", type=float, default=0.025,
+                        help="ignore slowdowns smaller than this many seconds (timer noise)")
+    parser.add_argument("--latency", type=float, default=0.0, help="mock server seconds per reply")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="mock server error fraction")
+    parser.add_argument("--json", type=Path, help="also write results to this file")
+    args = parser.parse_args()
+
+    cases = [c for c in CASES if not args.only or any(s in c.name for s in args.only)]
+    profile = "quick" if args.quick else "full"
+    if args.tolerance is None:
+        args.tolerance = 0.5 if args.quick else 0.25
+    baseline = load_baseline(args.baseline, profile)
+    sizes = Sizes.quick() if args.quick else Sizes()
+
+    with tempfile.TemporaryDirectory(prefix="cobol_bench_") as tmp, \
+            MockServer(MockConfig(latency=args.latency, error_rate=args.error_rate)) as srv:
+        ctx = Context(work=Path(tmp), sizes=sizes, mock_url=srv.base_url)
+        results = {CALIBRATION: {"status": "ok", "min_s": calibrate(), "median_s": 0.0}}
+        for case in cases:
+            print(f"[…] {case.name}", file=sys.stderr)
+            results[case.name] = run_case(case, ctx, args.repeat)
+
+    regressions = compare(results, baseline, args.tolerance, args.min_delta)
+    print_table(results, baseline)
+    if args.json:
+        args.json.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+    if args.save_baseline:
+        save_baseline(args.baseline, profile, results)
+        print(f"[✓] Baseline ({profile}) saved to {args.baseline}")
+    errors = [name for name, r in results.items() if r["status"] == "error"]
+    if errors:
+        print(f"[❌] {len(errors)} case(s) failed: {', '.join(errors)}")
+    if regressions:
+        print(f"[❌] {len(regressions)} regression(s): {', '.join(regressions)}")
+    if errors or regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
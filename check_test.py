@@ -1,32 +1,17 @@
 import json, os, re, openai
 
-# ---------- Load Coding Rules ----------
-with open("rules.json", encoding="utf-8") as f:
-    RULES = json.load(f)
+from llm_metrics import track
+from rule_store import RuleStore
 
-def rule_id(idx: int) -> str:
-    """Generate rule ID like R001, R002, etc."""
-    return f"R{idx+1:03d}"
+# ---------- Load Coding Rules ----------
+RULES = RuleStore.for_json("rules.json")
 
 def lookup_rules(rule_ids: list[str]) -> str:
-    """Return structured content for a list of rule IDs"""
-    blocks = []
-    for rule_id in rule_ids:
-        i = int(rule_id[1:]) - 1
-        if 0 <= i < len(RULES):
-            r = RULES[i]
-            block = (
-                f"[{rule_id}]\n"
-                f"【内容】{r['content']}\n"
-                f"【示例】{r['example']}"
-            )
-            blocks.append(block)
-    return "\n\n".join(blocks)
+    """Return structured content for a list of rule IDs (R001, R004, ...)"""
+    return RULES.details(rule_ids)
 
 # ---------- Build Summary Table ----------
-summary_table = "\n".join(
-    f"{i+1}. [{rule_id(i)}] {r['summary']}" for i, r in enumerate(RULES)
-)
+summary_table = RULES.summary_table()
 
 # ---------- Define local tool ----------
 tools = [
@@ -82,17 +67,21 @@ messages = [
 client = openai.OpenAI()  # Make sure OPENAI_API_KEY is set in your environment
 
 # ---------- Agent conversation loop ----------
+turn = 0
 while True:
-    resp = client.chat.completions.create(
-        model="gpt-4o-2024-05-13",  # Or "gpt-4o", "gpt-4o-mini", "gpt-4-1106-preview"
-        messages=messages,
-        tools=tools,
-        tool_choice="auto",
-    )
+    turn += 1
+    with track("check_test_turn", model="gpt-4o-2024-05-13", turn=turn) as event:
+        resp = client.chat.completions.create(
+            model="gpt-4o-2024-05-13",  # Or "gpt-4o", "gpt-4o-mini", "gpt-4-1106-preview"
+            messages=messages,
+            tools=tools,
+            tool_choice="auto",
+        )
+        event.set_usage(resp)
     msg = resp.choices[0].message
     # If the model called a tool:
     if msg.tool_calls:
-    messages.append(msg)  # Add assistant message with tool_calls
+        messages.append(msg)  # Add assistant message with tool_calls
         for call in msg.tool_calls:
             if call.function.name == "get_rule_detail_batch":
                 args = json.loads(call.function.arguments)
@@ -0,0 +1,303 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+llm_metrics.py  ──────────────────────────────────────────────────────────────
+Per-call instrumentation for model calls and pipeline stages.
+
+Every call wrapped in :func:`track` produces one structured event with
+wall time, time to first token (streamed calls only), prompt / completion
+tokens, retry count, cache hit/miss and JSON-parse failures.
+
+Outputs (one set per process run, under $LLM_TRACE_DIR, default ./llm_traces)
+━━━━━━━
+- <run_id>.jsonl    one JSON event per line, appended as calls finish
+- <run_id>.prom     Prometheus text-format metrics, written at exit
+- <run_id>.txt      human-readable summary report, written (and printed) at exit
+
+Metrics are aggregated as events arrive, so memory does not grow with the
+number of calls; only the last $LLM_METRICS_KEEP raw events (default 10000)
+are kept for events(). Long-running processes call set_retention(0) and
+serve prometheus_text() / call write_snapshot() instead of waiting for exit.
+
+Usage
+━━━━━
+    from llm_metrics import track
+
+    with track("summarize_batch", model="gpt-4.1-mini") as call:
+        resp = client.chat.completions.create(...)
+        call.set_usage(resp)
+
+    with track("extract_pdf", kind="stage"):
+        pages = extract_text_by_page(path)
+
+Set LLM_METRICS=0 to disable all output.
+"""
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+# ────────────────────────────────────────────────────────────────────────────
+# Configuration
+# ────────────────────────────────────────────────────────────────────────────
+ENABLED = os.getenv("LLM_METRICS", "1") != "0"
+TRACE_DIR = Path(os.getenv("LLM_TRACE_DIR", "llm_traces"))
+RUN_ID = datetime.now().strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}"
+KEEP_EVENTS = int(os.getenv("LLM_METRICS_KEEP", "10000"))
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Event record
+# ────────────────────────────────────────────────────────────────────────────
+
+@dataclass
+class CallEvent:
+    """One model call or pipeline stage. Fields are filled in by the caller."""
+
+    name: str
+    kind: str = "llm"                      # "llm" | "stage"
+    model: Optional[str] = None
+    run_id: str = RUN_ID
+    ts: float = field(default_factory=time.time)
+    wall_s: float = 0.0
+    ttft_s: Optional[float] = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    retries: int = 0
+    cache: Optional[str] = None            # "hit" | "miss" | None
+    json_errors: int = 0                   # replies (attempts) that failed JSON parsing
+    error: Optional[str] = None
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+    _t0: float = field(default=0.0, repr=False)
+
+    def mark_first_token(self) -> None:
+        """Call when the first streamed chunk arrives (only the first call counts)."""
+        if self.ttft_s is None:
+            self.ttft_s = time.perf_counter() - self._t0
+
+    def set_usage(self, response: Any) -> None:
+        """Copy token usage from an OpenAI response (SDK object or legacy dict)."""
+        usage = getattr(response, "usage", None)
+        if usage is None and isinstance(response, dict):
+            usage = response.get("usage")
+        if usage is None:
+            return
+        if isinstance(usage, dict):
+            self.prompt_tokens += usage.get("prompt_tokens", 0) or 0
+            self.completion_tokens += usage.get("completion_tokens", 0) or 0
+        else:
+            self.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+            self.completion_tokens += getattr(usage, "completion_tokens", 0) or 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        d = asdict(self)
+        d.pop("_t0", None)
+        return d
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Collector
+# ────────────────────────────────────────────────────────────────────────────
+
+_lock = threading.Lock()
+_events: Deque[CallEvent] = deque(maxlen=KEEP_EVENTS)
+_totals: Dict[tuple, Dict[str, Any]] = {}
+_event_count = 0
+_trace_fp = None
+
+
+def _emit(event: CallEvent) -> None:
+    global _trace_fp, _event_count
+    if not ENABLED:
+        return
+    line = json.dumps(event.to_dict(), ensure_ascii=False)
+    with _lock:
+        _events.append(event)
+        _add(_totals, event)
+        _event_count += 1
+        if _trace_fp is None:
+            TRACE_DIR.mkdir(parents=True, exist_ok=True)
+            _trace_fp = open(TRACE_DIR / f"{RUN_ID}.jsonl", "a", encoding="utf-8")
+        _trace_fp.write(line + "\n")
+        _trace_fp.flush()
+
+
+@contextmanager
+def track(name: str, kind: str = "llm", model: Optional[str] = None, **extra: Any) -> Iterator[CallEvent]:
+    """Time the enclosed block and record it as one event.
+
+    Exceptions are recorded in ``event.error`` and re-raised unchanged.
+    """
+    event = CallEvent(name=name, kind=kind, model=model, extra=extra)
+    event._t0 = time.perf_counter()
+    try:
+        yield event
+    except BaseException as e:
+        event.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        event.wall_s = time.perf_counter() - event._t0
+        _emit(event)
+
+
+def events() -> List[CallEvent]:
+    """Snapshot of the most recent raw events (see set_retention)."""
+    with _lock:
+        return list(_events)
+
+
+def set_retention(max_events: int) -> None:
+    """Keep at most ``max_events`` raw events in memory (0 = none). Aggregated
+    metrics are unaffected."""
+    global _events
+    with _lock:
+        _events = deque(_events, maxlen=max_events)
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Aggregation / export
+# ────────────────────────────────────────────────────────────────────────────
+
+def _add(agg: Dict[tuple, Dict[str, Any]], e: CallEvent) -> None:
+    a = agg.get((e.kind, e.name, e.model or ""))
+    if a is None:
+        a = agg[(e.kind, e.name, e.model or "")] = {
+            "count": 0, "errors": 0, "wall_sum": 0.0, "wall_max": 0.0,
+            "ttft_sum": 0.0, "ttft_count": 0,
+            "prompt_tokens": 0, "completion_tokens": 0, "retries": 0,
+            "cache_hit": 0, "cache_miss": 0, "json_errors": 0,
+        }
+    a["count"] += 1
+    a["errors"] += e.error is not None
+    a["wall_sum"] += e.wall_s
+    a["wall_max"] = max(a["wall_max"], e.wall_s)
+    if e.ttft_s is not None:
+        a["ttft_sum"] += e.ttft_s
+        a["ttft_count"] += 1
+    a["prompt_tokens"] += e.prompt_tokens
+    a["completion_tokens"] += e.completion_tokens
+    a["retries"] += e.retries
+    a["cache_hit"] += e.cache == "hit"
+    a["cache_miss"] += e.cache == "miss"
+    a["json_errors"] += e.json_errors
+
+
+def _aggregate(evts: Optional[List[CallEvent]]) -> Tuple[Dict[tuple, Dict[str, Any]], int]:
+    """(per-key totals, event count) for ``evts``, or the running totals if None."""
+    if evts is None:
+        with _lock:
+            return {k: dict(v) for k, v in _totals.items()}, _event_count
+    agg: Dict[tuple, Dict[str, Any]] = {}
+    for e in evts:
+        _add(agg, e)
+    return agg, len(evts)
+
+
+def _labels(kind: str, name: str, model: str, **more: str) -> str:
+    pairs = {"kind": kind, "name": name, "model": model, **more}
+    body = ",".join(
+        f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for k, v in pairs.items()
+    )
+    return "{" + body + "}"
+
+
+def prometheus_text(evts: Optional[List[CallEvent]] = None) -> str:
+    """Render events (default: all events of this run) as Prometheus text exposition format."""
+    agg, _count = _aggregate(evts)
+    metrics = [
+        ("llm_calls_total", "counter", "Number of tracked calls", lambda a: a["count"]),
+        ("llm_errors_total", "counter", "Calls that raised", lambda a: a["errors"]),
+        ("llm_wall_max_seconds", "gauge", "Slowest single call", lambda a: a["wall_max"]),
+        ("llm_retries_total", "counter", "Retries after a failed attempt", lambda a: a["retries"]),
+        ("llm_json_parse_failures_total", "counter", "Replies that failed JSON parsing", lambda a: a["json_errors"]),
+    ]
+    # durations are summaries (no quantiles): <name>_sum and <name>_count per label set
+    summaries = [
+        ("llm_wall_seconds", "Wall time of tracked calls", "wall_sum", "count"),
+        ("llm_ttft_seconds", "Time to first token (streamed calls only)", "ttft_sum", "ttft_count"),
+    ]
+    out: List[str] = []
+    for metric, mtype, help_text, get in metrics:
+        out.append(f"# HELP {metric} {help_text}")
+        out.append(f"# TYPE {metric} {mtype}")
+        for (kind, name, model), a in sorted(agg.items()):
+            out.append(f"{metric}{_labels(kind, name, model)} {get(a)}")
+
+    for metric, help_text, sum_key, count_key in summaries:
+        out.append(f"# HELP {metric} {help_text}")
+        out.append(f"# TYPE {metric} summary")
+        for (kind, name, model), a in sorted(agg.items()):
+            labels = _labels(kind, name, model)
+            out.append(f"{metric}_sum{labels} {a[sum_key]}")
+            out.append(f"{metric}_count{labels} {a[count_key]}")
+
+    out.append("# HELP llm_tokens_total Tokens reported by the API")
+    out.append("# TYPE llm_tokens_total counter")
+    for (kind, name, model), a in sorted(agg.items()):
+        for tok in ("prompt", "completion"):
+            out.append(f"llm_tokens_total{_labels(kind, name, model, type=tok)} {a[tok + '_tokens']}")
+
+    out.append("# HELP llm_cache_total Cache lookups by result")
+    out.append("# TYPE llm_cache_total counter")
+    for (kind, name, model), a in sorted(agg.items()):
+        if a["cache_hit"] or a["cache_miss"]:
+            for res in ("hit", "miss"):
+                out.append(f"llm_cache_total{_labels(kind, name, model, result=res)} {a['cache_' + res]}")
+    return "\n".join(out) + "\n"
+
+
+def summary_report(evts: Optional[List[CallEvent]] = None) -> str:
+    """Plain-text per-run summary, one row per (kind, name, model)."""
+    agg, count = _aggregate(evts)
+    header = f"{'kind':<6} {'name':<24} {'model':<22} {'calls':>5} {'err':>4} {'wall_s':>9} {'avg_s':>7} " \
+             f"{'ttft_s':>7} {'in_tok':>8} {'out_tok':>8} {'retry':>5} {'hit/miss':>9} {'json_err':>8}"
+    lines = [f"LLM metrics summary  run={RUN_ID}  events={count}", header, "─" * len(header)]
+    for (kind, name, model), a in sorted(agg.items()):
+        avg = a["wall_sum"] / a["count"] if a["count"] else 0.0
+        ttft = f"{a['ttft_sum'] / a['ttft_count']:.2f}" if a["ttft_count"] else "-"
+        cache = f"{a['cache_hit']}/{a['cache_miss']}" if a["cache_hit"] or a["cache_miss"] else "-"
+        lines.append(
+            f"{kind:<6} {name[:24]:<24} {model[:22]:<22} {a['count']:>5} {a['errors']:>4} {a['wall_sum']:>9.2f} "
+            f"{avg:>7.2f} {ttft:>7} {a['prompt_tokens']:>8} {a['completion_tokens']:>8} {a['retries']:>5} "
+            f"{cache:>9} {a['json_errors']:>8}"
+        )
+    return "\n".join(lines)
+
+
+def write_snapshot() -> Optional[str]:
+    """Write the Prometheus file and summary report for this run so far.
+    Returns the report, or None if nothing was recorded."""
+    if not ENABLED or not _event_count:
+        return None
+    TRACE_DIR.mkdir(parents=True, exist_ok=True)
+    (TRACE_DIR / f"{RUN_ID}.prom").write_text(prometheus_text(), encoding="utf-8")
+    report = summary_report()
+    (TRACE_DIR / f"{RUN_ID}.txt").write_text(report + "\n", encoding="utf-8")
+    return report
+
+
+def flush() -> None:
+    """Write the Prometheus file and summary report for this run (at exit)."""
+    global _trace_fp
+    report = write_snapshot()
+    if report is None:
+        return
+    print(report)
+    with _lock:
+        if _trace_fp is not None:
+            _trace_fp.close()
+            _trace_fp = None
+
+
+atexit.register(flush)
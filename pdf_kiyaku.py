@@ -1,9 +1,15 @@
 import os
+import re
 import json
+from collections import Counter, defaultdict
 import pdfplumber
 from openai import OpenAI
 from dotenv import load_dotenv
 
+from llm_metrics import track
+from response_parser import JsonArrayStream, collect_with_retry
+from rule_dedup import dedup_rules
+
 load_dotenv()
 
 if os.getenv("gpt") is not None:
@@ -34,51 +40,202 @@ def extract_text_by_page(file_path):
             page_texts.append(text)
     return page_texts
 
-def remove_known_headers_footers(lines):
-    cleaned_lines = []
-    for line in lines:
-        if any(keyword in line for keyword in [
-            "営業秘密", "E-COBOL コーディング規約書", "発行部署", "発行日", "版数", "改訂日", "文書番号", "印刷日", "第二開一"
-        ]):
-            continue
-        if "Copyright" in line or "NTT DATA CORPORATION" in line:
+HEADER_FOOTER_KEYWORDS = [
+    "営業秘密", "E-COBOL コーディング規約書", "発行部署", "発行日", "版数", "改訂日", "文書番号", "印刷日", "第二開一",
+    "Copyright", "NTT DATA CORPORATION",
+]
+
+PAGE_MARKER = re.compile(r"^--- Page (\d+) ---$", re.MULTILINE)
+_VARIABLE_PART = re.compile(r"(\d+|\s+)")
+_DIGITS = re.compile(r"\d+")
+_SLOT_SEP = "\x1f"   # separates a line's position tag from its text for the line filter
+EDGE_LINES = 3
+
+
+def _line_pattern(line):
+    """Regex body for a learned line: digit runs (page numbers, dates, 文書番号)
+    and whitespace runs may vary, everything else must match exactly."""
+    parts = []
+    for token in _VARIABLE_PART.split(line):
+        if not token:
             continue
-        cleaned_lines.append(line)
-    return cleaned_lines
-
-def clean_extracted_pages(pages):
-    cleaned = []
-    for page in pages:
-        lines = page.splitlines()
-        lines = [line.strip() for line in lines if line.strip()]
-        lines = remove_known_headers_footers(lines)
-        cleaned.append("\n".join(lines))
-    return cleaned
+        if token.isdigit():
+            parts.append(r"\d+")
+        elif token.isspace():
+            parts.append(r"\s+")
+        else:
+            parts.append(re.escape(token))
+    return "".join(parts)
+
+
+def _is_text_line(line):
+    return bool(line) and not PAGE_MARKER.match(line) and not line.startswith("|")
+
+
+def _edge_slots(n_lines, edge_lines=EDGE_LINES):
+    """{line index: [slot, ...]} for the first / last ``edge_lines`` text lines;
+    slot i counts from the top (0, 1, …), -1 - i from the bottom. On short pages
+    each side gets at most half the lines, so no line is both a top and a bottom
+    edge and the middle of a three-line page stays body text."""
+    slots = defaultdict(list)
+    for i in range(min(edge_lines, n_lines // 2)):
+        slots[i].append(i)
+        slots[n_lines - 1 - i].append(-1 - i)
+    return slots
+
+
+def _varies_like_page_number(occurrences):
+    """True if, across the pages a line shape was seen on, its digit runs are
+    either all constant or exactly one of them increases with the page (a page
+    counter). Lines whose numbers vary otherwise (例: WK-AREA-07, 第3章 規約 12)
+    are document content, not running headers/footers."""
+    fields = list(zip(*(digits for _page, digits in sorted(occurrences))))
+    varying = [f for f in fields if len(set(f)) > 1]
+    if not varying:
+        return True
+    if len(varying) > 1:
+        return False
+    numbers = [int(d) for d in varying[0]]
+    return all(a < b for a, b in zip(numbers, numbers[1:]))
+
+
+def learn_repeated_lines(pages, edge_lines=EDGE_LINES, min_ratio=0.5, min_pages=3):
+    """Return {slot: [pattern, …]} for lines that sit at the same position among
+    the first or last ``edge_lines`` text lines of at least ``min_ratio`` of
+    the pages (headers / footers).
+
+    A line shape is not learned if its numbers vary other than as a page
+    counter, or if it also appears outside the edge lines on ``min_ratio`` of
+    the pages (repeated body text). Page markers and table rows are never learned.
+    """
+    if len(pages) < min_pages:
+        return {}
+    edge = defaultdict(list)   # (pattern, slot) -> [(page index, digit runs)]
+    body = Counter()           # pattern -> pages where it occurs outside the edge lines
+    for p, page in enumerate(pages):
+        lines = [line for line in (ln.strip() for ln in page.splitlines()) if _is_text_line(line)]
+        slots = _edge_slots(len(lines), edge_lines)
+        body_patterns = set()
+        for i, line in enumerate(lines):
+            pattern = _line_pattern(line)
+            if i in slots:
+                for slot in slots[i]:
+                    edge[(pattern, slot)].append((p, tuple(_DIGITS.findall(line))))
+            else:
+                body_patterns.add(pattern)
+        body.update(body_patterns)
+
+    threshold = max(2, min_ratio * len(pages))
+    learned = defaultdict(set)
+    for (pattern, slot), occurrences in edge.items():
+        if len(occurrences) >= threshold and body[pattern] < threshold \
+                and _varies_like_page_number(occurrences):
+            learned[slot].add(pattern)
+    return {slot: sorted(patterns) for slot, patterns in sorted(learned.items())}
+
+
+def build_line_filter(keywords=HEADER_FOOTER_KEYWORDS, learned_patterns=None):
+    """One compiled matcher for configured keywords (substring, any line) and
+    learned header/footer lines (whole line, only at the slot they were learned
+    from).
+
+    The matcher is applied to "|<slot>|…\x1f<line>" strings built by
+    remove_known_headers_footers, so a learned pattern for slot 0 only hits the
+    first text line of a page.
+    """
+    sep = re.escape(_SLOT_SEP)
+    alternatives = [sep + ".*?" + re.escape(k) for k in keywords]
+    for slot, patterns in (learned_patterns or {}).items():
+        alternatives += [rf"\|{slot}\|[^{sep}]*{sep}{pattern}$" for pattern in patterns]
+    if not alternatives:
+        return None
+    return re.compile("|".join(alternatives))
+
+
+_DEFAULT_FILTER = build_line_filter()
+
+
+def remove_known_headers_footers(lines, line_filter=_DEFAULT_FILTER, edge_lines=EDGE_LINES):
+    if line_filter is None:
+        return list(lines)
+    text_idx = [i for i, line in enumerate(lines) if _is_text_line(line)]
+    slots = {text_idx[k]: s for k, s in _edge_slots(len(text_idx), edge_lines).items()}
+    kept = []
+    for i, line in enumerate(lines):
+        tag = "|" + "|".join(str(s) for s in slots.get(i, ())) + "|"
+        if PAGE_MARKER.match(line) or not line_filter.search(f"{tag}{_SLOT_SEP}{line}"):
+            kept.append(line)
+    return kept
+
+def clean_extracted_pages(pages, keywords=HEADER_FOOTER_KEYWORDS, learn=True):
+    page_lines = [[line.strip() for line in page.splitlines() if line.strip()] for page in pages]
+    learned = learn_repeated_lines(["\n".join(lines) for lines in page_lines]) if learn else {}
+    if learned:
+        print(f"Learned {sum(map(len, learned.values()))} repeated header/footer line(s)")
+    line_filter = build_line_filter(keywords, learned)
+    return ["\n".join(remove_known_headers_footers(lines, line_filter)) for lines in page_lines]
 
 def batch_pages(pages, batch_size=5):
     return [pages[i:i+batch_size] for i in range(0, len(pages), batch_size)]
 
-def summarize_batch(batch_text, instruction):
-    clipped_text = "\n\n".join(batch_text)[:6000]
-    full_prompt = f"{instruction}\n\n{clipped_text}"
-    response = client.chat.completions.create(
-        model="gpt-4.1-mini",
-        messages=[{"role": "user", "content": full_prompt}],
-        temperature=0.2
-    )
-    content = response.choices[0].message.content.strip()
-
-    if content.startswith("```json"):
-        content = content[7:]
-    if content.endswith("```"):
-        content = content[:-3]
-    content = content.strip()
+PAGE_FIELD_INSTRUCTION = (
+    'Add an integer "page" field to every item: the N of the "--- Page N ---" marker '
+    "of the page the rule comes from. Output the items in page order."
+)
 
-    try:
-        return json.loads(content)
-    except json.JSONDecodeError as e:
-        print("Error JSON format：", content[:300])
-        raise e
+def _page_asker(pages_by_num, instruction, model, call):
+    """ask(page_nums) for collect_with_retry: send only those pages, parse the
+    streamed reply item by item."""
+    def ask(page_nums):
+        clipped_text = "\n\n".join(pages_by_num[n] for n in page_nums)[:6000]
+        full_prompt = f"{instruction}\n\n{PAGE_FIELD_INSTRUCTION}\n\n{clipped_text}"
+        stream = client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": full_prompt}],
+            temperature=0.2,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        parser = JsonArrayStream()
+        try:
+            for chunk in stream:
+                if chunk.usage is not None:
+                    call.set_usage(chunk)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    call.mark_first_token()
+                    parser.feed(chunk.choices[0].delta.content)
+        except Exception as e:
+            # connection dropped mid-stream: keep the items that arrived, re-ask the rest
+            parser.result.error = f"{type(e).__name__}: {e}"
+        result = parser.close()
+        if not result.ok and not result.error:
+            call.json_errors += 1   # counted per attempt, not just for the last reply
+        return result
+    return ask
+
+def summarize_batch(batch_text, instruction, model="gpt-4.1-mini", max_retries=2):
+    pages_by_num = {}
+    for pos, page in enumerate(batch_text, start=1):
+        m = PAGE_MARKER.search(page)
+        pages_by_num[int(m.group(1)) if m else pos] = page
+
+    with track("summarize_batch", model=model, pages=len(batch_text)) as call:
+        def on_retry(page_nums):
+            call.retries += 1
+            print(f"  ↻ reply incomplete, re-asking pages {page_nums}")
+
+        items, last = collect_with_retry(
+            _page_asker(pages_by_num, instruction, model, call), list(pages_by_num), key="page",
+            max_retries=max_retries, resume_inclusive=True, on_retry=on_retry,
+        )
+        if not last.ok and not last.error:
+            print("Error JSON format：", (last.errors[:1] or [last.tail])[0][:300])
+        if last.missing:
+            print(f"  ⚠ pages {last.missing} not covered after {max_retries} retries"
+                  + (f" ({last.error})" if last.error else ""))
+        if not items and not last.complete:
+            raise ValueError(last.error or "no JSON array could be salvaged from the reply")
+        return items
 
 def save_to_json(content, filename="summary.json"):
     script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -91,8 +248,10 @@ if __name__ == "__main__":
     pdf_path = os.path.join(os.path.dirname(__file__), "sample.pdf")
 
     print("Extracting PDF...")
-    all_pages = extract_text_by_page(pdf_path)
-    cleaned_pages = clean_extracted_pages(all_pages)
+    with track("extract_text_by_page", kind="stage"):
+        all_pages = extract_text_by_page(pdf_path)
+    with track("clean_extracted_pages", kind="stage"):
+        cleaned_pages = clean_extracted_pages(all_pages)
     page_batches = batch_pages(cleaned_pages, batch_size=5)
 
     prompt = """
@@ -126,8 +285,24 @@ if __name__ == "__main__":
         print(f"🔄 Batch {idx}/{len(page_batches)}")
         try:
             result = summarize_batch(batch, prompt)
-            final_results.extend(result)
+            batch_page_nums = [int(n) for page in batch for n in PAGE_MARKER.findall(page)]
+            rules = [rule for rule in result if isinstance(rule, dict)]
+            if len(rules) < len(result):
+                print(f" Batch {idx}: skipped {len(result) - len(rules)} non-object item(s)")
+            for rule in rules:
+                rule["source_batch"] = idx
+                rule["source_pages"] = [rule["page"]] if isinstance(rule.get("page"), int) else batch_page_nums
+            final_results.extend(rules)
         except Exception as e:
             print(f" Batch {idx} failed:", e)
 
-    save_to_json(final_results, "summary_gpt4.1mini_all.json")
+    # raw model output first, so a dedup problem never costs the API calls
+    save_to_json(final_results, "summary_gpt4.1mini_raw.json")
+    try:
+        with track("dedup_rules", kind="stage", rules=len(final_results)):
+            deduped = dedup_rules(final_results)
+        print(f"Dedup: {len(final_results)} → {len(deduped)} rules")
+    except Exception as e:
+        print(" Dedup failed, saving rules without dedup:", e)
+        deduped = final_results
+    save_to_json(deduped, "summary_gpt4.1mini_all.json")
@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+response_parser.py  ──────────────────────────────────────────────────────────
+Incremental parsing of JSON-array model replies, with partial-result salvage
+and targeted retry.
+
+Model replies are supposed to be one JSON array, but in practice they come
+wrapped in ``` fences or prose, get cut off at the token limit, or contain a
+single malformed element. Instead of json.loads()-ing the whole reply and
+throwing everything away on error, JsonArrayStream consumes the reply (or the
+streamed chunks) item by item and keeps every well-formed element.
+
+collect_with_retry() then works out which input units (pages, lines) the
+reply did not cover and re-asks the model for only those units.
+
+Usage
+━━━━━
+    stream = JsonArrayStream()
+    for chunk in completion_stream:
+        for item in stream.feed(chunk_text):
+            handle(item)
+    result = stream.close()        # ParseResult(items, complete, errors)
+
+    items, last = collect_with_retry(ask_pages, page_numbers, key="page")
+    if last.missing:               # units still uncovered (last.error: why the call failed)
+        ...
+"""
+from __future__ import annotations
+
+import json
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+@dataclass
+class ParseResult:
+    items: List[Any] = field(default_factory=list)
+    complete: bool = False              # closing ']' of the top-level array was seen
+    errors: List[str] = field(default_factory=list)   # raw text of malformed elements
+    tail: str = ""                      # unterminated element text when truncated
+    error: Optional[str] = None         # exception raised by the model call, if any
+    missing: List[int] = field(default_factory=list)  # units still uncovered (set by collect_with_retry)
+
+    @property
+    def ok(self) -> bool:
+        return self.complete and not self.errors
+
+
+class JsonArrayStream:
+    """Incremental parser for the first top-level JSON array in a text stream.
+
+    Text before the array (``` fences, prose, or an enclosing object such as
+    {"suggestions": [...]}) is skipped; everything after the array closes is
+    ignored. A '[' only starts the array if the next non-blank character is
+    '{', '[', '"' or ']', so prose like "rules [page 1-5]:" is skipped, and if
+    the first element is malformed and not an object, the parser assumes it
+    locked onto prose and looks for the next '[' instead.
+    """
+
+    _ARRAY_FIRST = '{["]'
+
+    def __init__(self):
+        self._opening = False               # saw '[', waiting for its first non-blank char
+        self._started = False
+        self._done = False
+        self._depth = 0
+        self._in_str = False
+        self._esc = False
+        self._elem: List[str] = []
+        self.result = ParseResult()
+
+    def feed(self, text: str) -> List[Any]:
+        """Consume more text; return elements completed by it."""
+        out: List[Any] = []
+        for ch in text:
+            if self._done:
+                break
+            if not self._started:
+                if self._opening and not ch.isspace():
+                    self._opening = False
+                    if ch in self._ARRAY_FIRST:
+                        self._started, self._depth = True, 1
+                        self._step(ch, out)
+                        continue
+                if ch == "[":
+                    self._opening = True
+                continue
+            self._step(ch, out)
+        return out
+
+    def _step(self, ch: str, out: List[Any]) -> None:
+        if self._in_str:
+            self._elem.append(ch)
+            if self._esc:
+                self._esc = False
+            elif ch == "\\":
+                self._esc = True
+            elif ch == '"':
+                self._in_str = False
+            return
+
+        if self._depth == 1:
+            if ch in ",]":
+                self._finish(out)           # scalar element (objects finish on their close)
+                if ch == "]" and self._started:
+                    self._depth, self._done, self.result.complete = 0, True, True
+                return
+            if ch.isspace() and not self._elem:
+                return
+
+        self._elem.append(ch)
+        if ch == '"':
+            self._in_str = True
+        elif ch in "[{":
+            self._depth += 1
+        elif ch in "]}":
+            self._depth -= 1
+            if self._depth == 1:
+                self._finish(out)
+
+    def _finish(self, out: List[Any]) -> None:
+        raw = "".join(self._elem).strip()
+        self._elem = []
+        if not raw:
+            return
+        try:
+            item = json.loads(raw)
+        except json.JSONDecodeError:
+            if not self.result.items and not self.result.errors and not raw.startswith("{"):
+                self._restart()
+                return
+            self.result.errors.append(raw)
+            return
+        self.result.items.append(item)
+        out.append(item)
+
+    def _restart(self) -> None:
+        """Not the array after all: drop it and scan on for the next '['."""
+        self._started = self._in_str = self._esc = False
+        self._depth = 0
+
+    def close(self) -> ParseResult:
+        """End of input. An unterminated element is kept in ``result.tail``."""
+        if not self.result.complete:
+            self.result.tail = "".join(self._elem).strip()
+        return self.result
+
+
+def parse_json_array(text: str) -> ParseResult:
+    """Parse a complete reply with the incremental parser."""
+    stream = JsonArrayStream()
+    stream.feed(text)
+    return stream.close()
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Coverage / targeted retry
+# ────────────────────────────────────────────────────────────────────────────
+
+def _unit_of(raw: str, key: str) -> Optional[int]:
+    m = re.search(rf'"{re.escape(key)}"\s*:\s*(\d+)', raw)
+    return int(m.group(1)) if m else None
+
+
+def units_to_retry(result: ParseResult, units: Sequence[int], key: str,
+                   resume_inclusive: bool = False) -> List[int]:
+    """Input units the reply did not (fully) cover.
+
+    - units named by malformed elements
+    - if the reply was cut off: every unit after the last one seen
+      (and that last one too when ``resume_inclusive``, e.g. a page that can
+      hold several items)
+    A complete reply that simply has no item for a unit counts as covered —
+    "no findings on this page/line" is a valid answer.
+    """
+    missing = {u for u in (_unit_of(raw, key) for raw in result.errors) if u is not None}
+    if not result.complete:
+        seen = [item.get(key) for item in result.items if isinstance(item, dict) and isinstance(item.get(key), int)]
+        last = max(seen) if seen else None
+        if last is None:
+            missing.update(units)
+        else:
+            missing.update(u for u in units if u > last or (resume_inclusive and u == last))
+    if result.errors and not missing:
+        missing.update(units)  # malformed element with no recognisable unit
+    return [u for u in units if u in missing]
+
+
+def collect_with_retry(ask: Callable[[List[int]], ParseResult], units: Sequence[int], key: str,
+                       max_retries: int = 2, resume_inclusive: bool = False,
+                       on_retry: Optional[Callable[[List[int]], None]] = None,
+                       backoff: float = 1.0) -> Tuple[List[Any], ParseResult]:
+    """Call ``ask(units)`` and re-ask for uncovered units only, up to
+    ``max_retries`` times. Returns (all salvaged items, last ParseResult).
+
+    An exception from ``ask`` (rate limit, timeout) counts as a reply that
+    covered nothing: it is recorded in ``last.error``, the same units are
+    asked again after ``backoff`` × 2^attempt seconds, and items salvaged by
+    earlier attempts are kept. Units still uncovered at the end are in
+    ``last.missing``; nothing is raised.
+    """
+    items: List[Any] = []
+    held: Dict[Any, List[Any]] = {}  # items for re-asked units, until a later reply answers that unit
+    pending = list(units)
+    result = ParseResult(complete=True)
+    for attempt in range(max_retries + 1):
+        try:
+            result = ask(pending)
+        except Exception as e:
+            result = ParseResult(error=f"{type(e).__name__}: {e}")
+        for unit in {i.get(key) for i in result.items if isinstance(i, dict)}:
+            held.pop(unit, None)
+        retry = units_to_retry(result, pending, key, resume_inclusive)
+        if not retry or attempt == max_retries:
+            items.extend(result.items)
+            result.missing = retry
+            break
+        retry_set = set(retry) if resume_inclusive else set()
+        for i in result.items:
+            if isinstance(i, dict) and i.get(key) in retry_set:
+                held.setdefault(i[key], []).append(i)
+            else:
+                items.append(i)
+        if on_retry:
+            on_retry(retry)
+        if result.error:
+            time.sleep(backoff * 2 ** attempt)
+        pending = retry
+    items.extend(i for group in held.values() for i in group)
+    return items, result
+
+
+def merge_by_key(items: Iterable[Dict], key: str) -> Dict[Any, Dict]:
+    """Last item wins per key — for per-line suggestions gathered over retries."""
+    return {item[key]: item for item in items if isinstance(item, dict) and key in item}
@@ -0,0 +1,457 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+review_server.py  ────────────────────────────────────────────────────────────
+Long-running local review daemon with warm state and request micro-batching.
+
+The script tools (check_by_category, tag_rules, formatter …) cold-start on
+every run: imports, rule file load, summary table rebuild, API client
+creation. This server does all of that once and keeps it in memory:
+
+- the rule store (rule_store.RuleStore) and its per-chapter rule batches,
+  rebuilt only when the store version changes
+- checklist embeddings for tagging
+- compiled static formatting checks
+- one OpenAI client (pooled HTTP connections) shared by all requests
+
+Concurrent requests that hit the same rule batch are micro-batched: their
+sources are sent together in one model call and the reply is split back per
+request. Identical sources share a single slot.
+
+Endpoints (JSON in / JSON out)
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+GET  /health                                  rule count, store version
+GET  /metrics                                 Prometheus text (llm_metrics totals)
+POST /review  {"code": str, "chapters"?: [str]}
+              → {"reports": [{"chapter", "batch", "result"}, …]}
+POST /format  {"code": str}                   → {"code": str, "changes": int}
+POST /tag     {"rules": [{"id", "rule_title", "rule_text"}, …]}
+              → {"tags": {rule_id: check_id | null}}
+
+Usage
+━━━━━
+$ python review_server.py --rules rule_extended.json --checklist checklist.xlsx
+$ curl -s localhost:8780/review -d '{"code": "..."}'
+
+Set OPENAI_API_KEY (and OPENAI_BASE_URL to use bench_mock_server.py).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+from openai import OpenAI
+
+from Agent_formatter import apply_format_batches
+import llm_metrics
+from llm_metrics import track
+from rule_store import RuleStore
+
+# ────────────────────────────────────────────────────────────────────────────
+# Configuration
+# ────────────────────────────────────────────────────────────────────────────
+REVIEW_MODEL = "gpt-4.1"
+TAG_MODEL = "gpt-3.5-turbo"
+EMBED_MODEL = "text-embedding-3-small"
+BATCH_SIZE = 20            # rules per review prompt (same as check_by_category)
+BATCH_WINDOW = 0.05        # seconds to wait for more requests on the same key
+MAX_SOURCES = 4            # sources per shared review call
+METRICS_INTERVAL = 60      # seconds between llm_traces/<run>.prom|.txt snapshots
+
+# Prompts mirror check_by_category / tag_rules so results are comparable.
+SYSTEM_TEMPLATE = """\
+You are an enterprise COBOL code reviewer.
+Focus on the rules of chapter '{chapter}' (category: '{category_focus}').
+Return every violation in Markdown table format:
+| line | rule_id | violated_rule_title | reason |
+If no violation, output 'All rules satisfied.' only.
+"""
+
+MULTI_SOURCE_NOTE = """\
+Several COBOL sources are given, each under a '### SOURCE <n>' heading.
+Review each one separately and answer with the same '### SOURCE <n>' headings,
+one section per source, in order.
+"""
+
+USER_TEMPLATE = """【Rules List】
+{rules_text}
+
+【COBOL Source】
+cobol
+{code_block}
+"""
+
+TAG_SYSTEM_PROMPT = (
+    "あなたは熟練したCOBOLコードレビュアーです。次に示す業務規約(Rule)に対し、"
+    "候補リスト(Candidates)の中から最も適合する Checklist 番号を1つだけ選んで下さい。"
+    "該当するものが無ければ NONE と答えて下さい。出力は Checklist 番号1語、あるいは文字列 'NONE' のみとします。"
+)
+
+# tolerant on purpose ("### SOURCE 1:", "**SOURCE 1**"): anything that looks like
+# a heading counts, and a reply whose headings don't line up is not split at all
+SOURCE_HEADING = re.compile(r"^[ \t]*(?:#{1,6}[ \t]*|\*\*)?SOURCE[ \t]+(\d+)\b[^\n]*$", re.MULTILINE | re.IGNORECASE)
+
+# static formatting check (same keyword set as `formatter`): control
+# statements start in column 12, other statements in column 15; Area-A lines
+# (paragraph / section headers, EXIT., END PROGRAM) are left where they are.
+# One-word statements (END-IF., GOBACK., CONTINUE.) look like paragraph
+# headers but belong in Area B, so they are excluded.
+AREA_A_LINE = re.compile(
+    r"^(?!(?:GOBACK|CONTINUE|END-(?:ACCEPT|ADD|CALL|COMPUTE|DELETE|DISPLAY|DIVIDE|EVALUATE|EXEC|IF|"
+    r"MULTIPLY|PERFORM|READ|RECEIVE|RETURN|REWRITE|SEARCH|START|STRING|SUBTRACT|UNSTRING|WRITE))\.$)"
+    r"(?:[A-Z0-9][A-Z0-9-]*(?:\s+SECTION)?|END\s+PROGRAM\s+\S+)\.$",
+    re.IGNORECASE,
+)
+CONTROL_KEYWORDS = re.compile(
+    r"^(IF|ELSE|END-IF|EVALUATE|WHEN|END-EVALUATE|PERFORM|END-PERFORM|ADD|SUBTRACT|MULTIPLY|"
+    r"DIVIDE|COMPUTE|STRING|END-STRING|ON SIZE ERROR|NOT ON SIZE ERROR|ON OVERFLOW)\b"
+)
+PROCEDURE_DIVISION = re.compile(r"\bPROCEDURE\s+DIVISION\b", re.IGNORECASE)
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Micro-batching
+# ────────────────────────────────────────────────────────────────────────────
+
+class MicroBatcher:
+    """Collect items submitted under the same key for up to ``window`` seconds
+    (or until ``max_items``) and process them with one ``fn(key, items)`` call,
+    which must return one result per item."""
+
+    def __init__(self, fn: Callable[[Hashable, List], List], window: float, max_items: int):
+        self.fn = fn
+        self.window = window
+        self.max_items = max_items
+        self._lock = threading.Lock()
+        self._pending: Dict[Hashable, List[Tuple[object, Future]]] = {}
+
+    def submit(self, key: Hashable, item) -> object:
+        fut: Future = Future()
+        with self._lock:
+            group = self._pending.get(key)
+            if group is None:
+                group = self._pending[key] = []
+                threading.Timer(self.window, self._flush, args=(key, group)).start()
+            group.append((item, fut))
+            full = len(group) >= self.max_items
+        if full:
+            self._flush(key, group)
+        return fut.result()
+
+    def _flush(self, key: Hashable, group: List) -> None:
+        with self._lock:
+            if self._pending.get(key) is not group:
+                return  # already flushed
+            del self._pending[key]
+        items = [item for item, _ in group]
+        try:
+            results = self.fn(key, items)
+            for (_, fut), res in zip(group, results):
+                fut.set_result(res)
+        except BaseException as e:
+            for _, fut in group:
+                if not fut.done():
+                    fut.set_exception(e)
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Warm service state
+# ────────────────────────────────────────────────────────────────────────────
+
+class ReviewService:
+    def __init__(self, rules_path: Path, checklist_path: Optional[Path] = None,
+                 review_model: str = REVIEW_MODEL, window: float = BATCH_WINDOW,
+                 max_sources: int = MAX_SOURCES, client: Optional[OpenAI] = None):
+        self.client = client or OpenAI()
+        self.review_model = review_model
+        self.store = RuleStore.for_json(rules_path)
+        self._batches_version = -1
+        self._batches: Dict[str, List[List[Dict]]] = {}
+        self._batches_lock = threading.Lock()
+        self.reviewer = MicroBatcher(self._review_batch, window, max_sources)
+        self.embedder = MicroBatcher(self._embed_batch, window, 256)
+        self.checklist: List[Tuple[str, str, Optional[str]]] = []
+        self.checklist_emb = None
+        if checklist_path:
+            self._load_checklist(checklist_path)
+
+    # ── rules ─────────────────────────────────────────────────────────────
+
+    def rule_batches(self) -> Tuple[int, Dict[str, List[List[Dict]]]]:
+        """(store version, per-chapter rule batches); rebuilt only when the store changes."""
+        self.store.sync()
+        with self._batches_lock:
+            if self._batches_version != self.store.version:
+                batches = {}
+                for chapter in self.store.chapters():
+                    rules = self.store.by_chapter(chapter)
+                    batches[chapter] = [rules[i:i + BATCH_SIZE] for i in range(0, len(rules), BATCH_SIZE)]
+                self._batches, self._batches_version = batches, self.store.version
+            return self._batches_version, self._batches
+
+    # ── review ────────────────────────────────────────────────────────────
+
+    def review(self, code: str, chapters: Optional[List[str]] = None) -> List[Dict]:
+        version, batches = self.rule_batches()
+        jobs = []
+        for chapter, chapter_batches in batches.items():
+            if chapters and chapter not in chapters:
+                continue
+            for n, sub_rules in enumerate(chapter_batches):
+                jobs.append((chapter, n, sub_rules))
+
+        results = parallel(
+            lambda job: self.reviewer.submit((version, job[0], job[1]), (code, job[2])), jobs)
+
+        reports = []
+        for (chapter, n, sub_rules), result in zip(jobs, results):
+            start = n * BATCH_SIZE
+            reports.append({"chapter": chapter, "batch": f"{start + 1}-{start + len(sub_rules)}", "result": result})
+        return reports
+
+    def _review_batch(self, key, items: List[Tuple[str, List[Dict]]]) -> List[str]:
+        _version, chapter, _n = key
+        sub_rules = items[0][1]
+        sources = list(dict.fromkeys(code for code, _ in items))  # identical sources share a slot
+        per_source = split_sources(self._ask_review(chapter, sub_rules, sources), len(sources))
+        missing = [i for i, result in enumerate(per_source) if result is None]
+        if missing:
+            # never guess: a source without its own section is reviewed again on its own
+            print(f"[!] {chapter}: reply not split cleanly, re-reviewing {len(missing)} source(s) one per call")
+            redo = parallel(lambda i: self._ask_review(chapter, sub_rules, [sources[i]]).strip(), missing)
+            for i, result in zip(missing, redo):
+                per_source[i] = result
+        by_code = dict(zip(sources, per_source))
+        return [by_code[code] for code, _ in items]
+
+    def _ask_review(self, chapter: str, sub_rules: List[Dict], sources: List[str]) -> str:
+        system_prompt = SYSTEM_TEMPLATE.format(chapter=chapter, category_focus=sub_rules[0].get("category", "N/A"))
+        rules_text = self.store.review_text(r["id"] for r in sub_rules)
+        if len(sources) == 1:
+            code_block = sources[0]
+        else:
+            system_prompt += MULTI_SOURCE_NOTE
+            code_block = "\n\n".join(f"### SOURCE {i + 1}\n{src}" for i, src in enumerate(sources))
+        user_prompt = USER_TEMPLATE.format(rules_text=rules_text, code_block=code_block)
+
+        with track("review_server.review", model=self.review_model, sources=len(sources)) as call:
+            resp = self.client.chat.completions.create(
+                model=self.review_model,
+                temperature=0,
+                messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
+            )
+            call.set_usage(resp)
+        return resp.choices[0].message.content or ""
+
+    # ── format ────────────────────────────────────────────────────────────
+
+    def format(self, code: str) -> Tuple[str, int]:
+        lines = code.splitlines()
+        start = next((i + 1 for i, ln in enumerate(lines) if PROCEDURE_DIVISION.search(ln)), len(lines))
+        batch = []
+        for idx in range(start, len(lines)):
+            stripped = lines[idx].strip()
+            if not stripped or stripped.startswith("*") or AREA_A_LINE.match(stripped):
+                continue
+            col = 12 if CONTROL_KEYWORDS.match(stripped) else 15
+            if lines[idx].ljust(72) != (" " * (col - 1) + stripped).ljust(72):
+                batch.append({"line": idx, "target_col": col})
+        if not batch:
+            return code, 0
+        formatted, _ = apply_format_batches(lines, [{"lines": batch, "reason": "static format check"}])
+        return "\n".join(formatted), len(batch)
+
+    # ── tag ───────────────────────────────────────────────────────────────
+
+    def _load_checklist(self, path: Path) -> None:
+        import numpy as np
+        import pandas as pd
+
+        df = pd.read_excel(path)
+        if not {"id", "item"}.issubset(df.columns):
+            raise ValueError("checklist.xlsx must contain columns 'id' and 'item'")
+        self.checklist = [(str(r["id"]), str(r["item"]), r.get("category")) for _, r in df.iterrows()]
+        with track("review_server.checklist_embeddings", kind="stage", items=len(self.checklist)):
+            emb = np.array(self._embed_batch(None, [item for _, item, _ in self.checklist]))
+        self.checklist_emb = emb / (np.linalg.norm(emb, axis=1, keepdims=True) + 1e-8)
+
+    def _embed_batch(self, _key, texts: List[str]) -> List[List[float]]:
+        with track("review_server.embed", model=EMBED_MODEL, inputs=len(texts)) as call:
+            resp = self.client.embeddings.create(model=EMBED_MODEL, input=texts)
+            call.set_usage(resp)
+        return [d.embedding for d in sorted(resp.data, key=lambda d: d.index)]
+
+    def tag(self, rules: List[Dict], top_k: int = 5, thresh: float = 0.55) -> Dict[str, Optional[str]]:
+        import numpy as np
+
+        if self.checklist_emb is None:
+            raise ValueError("server was started without --checklist")
+        texts = [rule.get("rule_title", "") + "\n" + rule.get("rule_text", "") for rule in rules]
+        embeddings = parallel(lambda text: self.embedder.submit("embed", text), texts)
+        tags: Dict[str, Optional[str]] = {}
+        for rule, text, emb in zip(rules, texts, embeddings):
+            emb = np.array(emb)
+            sims = self.checklist_emb @ (emb / (np.linalg.norm(emb) + 1e-8))
+            top = [i for i in sims.argsort()[-top_k:][::-1] if sims[i] >= thresh]
+            tags[str(rule.get("id"))] = self._choose(text, [self.checklist[i][:2] for i in top]) if top else None
+        return tags
+
+    def _choose(self, rule_txt: str, candidates: List[Tuple[str, str]]) -> Optional[str]:
+        lines = [f"{i + 1}. {cid}: {citem}" for i, (cid, citem) in enumerate(candidates)]
+        prompt_user = "Rule:\n" + rule_txt.strip() + "\n\n" + "Candidates:\n" + "\n".join(lines)
+        with track("review_server.choose_checklist", model=TAG_MODEL, candidates=len(candidates)) as call:
+            resp = self.client.chat.completions.create(
+                model=TAG_MODEL,
+                temperature=0,
+                messages=[{"role": "system", "content": TAG_SYSTEM_PROMPT}, {"role": "user", "content": prompt_user}],
+            )
+            call.set_usage(resp)
+        answer = (resp.choices[0].message.content or "").strip().upper()
+        return None if not answer or answer == "NONE" else answer.split()[0]
+
+
+def parallel(fn: Callable, items: List) -> List:
+    """Run ``fn`` over ``items`` in threads (so their micro-batcher submissions
+    overlap) and return results in order; the first exception is re-raised."""
+    results: List = [None] * len(items)
+    errors: List[BaseException] = []
+
+    def run(i: int) -> None:
+        try:
+            results[i] = fn(items[i])
+        except BaseException as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(items))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if errors:
+        raise errors[0]
+    return results
+
+
+def split_sources(answer: str, n: int) -> List[Optional[str]]:
+    """Split a multi-source reply on 'SOURCE <n>' headings.
+
+    A source whose section is missing or empty gets None, and so does every
+    source if the split is ambiguous (no headings, a repeated or out-of-range
+    number, text before the first heading) — the caller re-reviews those
+    sources instead of guessing.
+    """
+    if n == 1:
+        return [answer.strip()]
+    marks = list(SOURCE_HEADING.finditer(answer))
+    numbers = [int(m.group(1)) for m in marks]
+    if (not marks or len(set(numbers)) != len(numbers) or not all(1 <= k <= n for k in numbers)
+            or answer[:marks[0].start()].strip()):
+        return [None] * n
+    sections: Dict[int, str] = {}
+    for i, m in enumerate(marks):
+        end = marks[i + 1].start() if i + 1 < len(marks) else len(answer)
+        sections[numbers[i]] = answer[m.end():end].strip()
+    return [sections.get(i + 1) or None for i in range(n)]
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# HTTP layer
+# ────────────────────────────────────────────────────────────────────────────
+
+class ReviewHandler(BaseHTTPRequestHandler):
+    service: ReviewService
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        print(f"[{time.strftime('%H:%M:%S')}] {self.address_string()} {fmt % args}")
+
+    def _send(self, status: int, body: Dict) -> None:
+        self._send_raw(status, json.dumps(body, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8")
+
+    def _send_raw(self, status: int, data: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/health":
+            store = self.service.store
+            self._send(200, {"status": "ok", "rules": len(store), "version": store.version})
+        elif self.path == "/metrics":
+            self._send_raw(200, llm_metrics.prometheus_text().encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8")
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            req = json.loads(self.rfile.read(length) or b"{}")
+            if self.path == "/review":
+                self._send(200, {"reports": self.service.review(req["code"], req.get("chapters"))})
+            elif self.path == "/format":
+                code, changes = self.service.format(req["code"])
+                self._send(200, {"code": code, "changes": changes})
+            elif self.path == "/tag":
+                self._send(200, {"tags": self.service.tag(req["rules"], req.get("topk", 5), req.get("threshold", 0.55))})
+            else:
+                self._send(404, {"error": "not found"})
+        except (KeyError, ValueError) as e:
+            self._send(400, {"error": f"{type(e).__name__}: {e}"})
+        except Exception as e:
+            self._send(500, {"error": f"{type(e).__name__}: {e}"})
+
+
+def start_metrics_snapshots(interval: float) -> threading.Thread:
+    """Rewrite the .prom / .txt metrics files every ``interval`` seconds."""
+    def loop() -> None:
+        while True:
+            time.sleep(interval)
+            llm_metrics.write_snapshot()
+
+    thread = threading.Thread(target=loop, name="metrics-snapshot", daemon=True)
+    thread.start()
+    return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local COBOL review daemon")
+    parser.add_argument("--rules", type=Path, default=Path("rule_extended.json"))
+    parser.add_argument("--checklist", type=Path, help="checklist.xlsx for /tag")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8780)
+    parser.add_argument("--model", default=REVIEW_MODEL)
+    parser.add_argument("--window", type=float, default=BATCH_WINDOW, help="micro-batch window in seconds")
+    parser.add_argument("--max-sources", type=int, default=MAX_SOURCES, help="sources per shared review call")
+    parser.add_argument("--metrics-interval", type=float, default=METRICS_INTERVAL,
+                        help="seconds between metrics snapshots under llm_traces/ (0 = only at exit)")
+    args = parser.parse_args()
+
+    # a daemon keeps only the aggregated metrics, never the raw per-call events
+    llm_metrics.set_retention(0)
+    if args.metrics_interval > 0:
+        start_metrics_snapshots(args.metrics_interval)
+
+    service = ReviewService(args.rules, args.checklist, args.model, args.window, args.max_sources)
+    handler = type("BoundReviewHandler", (ReviewHandler,), {"service": service})
+    httpd = ThreadingHTTPServer((args.host, args.port), handler)
+    httpd.daemon_threads = True
+    print(f"[✓] Review server on http://{args.host}:{args.port}  ({len(service.store)} rules)")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+rule_dedup.py  ───────────────────────────────────────────────────────────────
+Merge near-duplicate rules produced by batch summarization (pdf_kiyaku.py).
+
+Overlapping page batches are summarized independently, so the same rule
+shows up several times with slightly different rule_title wording. This
+stage clusters them with MinHash + LSH (no pairwise comparison of every
+rule against every other) and keeps one canonical rule per cluster.
+
+Pipeline
+━━━━━━━━━
+1. Character 3-gram shingles of rule_text (NFKC, whitespace and punctuation
+   removed — works for Japanese without a tokenizer). rule_title is a
+   paraphrase written by the model, so it is only used when rule_text is empty.
+2. MinHash signature per rule; LSH banding yields candidate pairs.
+3. Candidates are confirmed with exact Jaccard similarity >= threshold and
+   identical numbers in rule_text ("3階層" and "5階層" are different rules),
+   then joined with union-find.
+4. Per cluster the rule with the longest rule_text is canonical; provenance
+   (source_batches, source_pages, merged_titles, merged_texts) is merged
+   from all members, so no member's wording is lost.
+
+Threshold
+━━━━━━━━━
+0.5 separates the two on the 規約 phrases in bench_corpus and reworded
+summarizer variants of them: distinct rules score <= 0.17, re-extractions
+of the same rule 0.57–1.0 (particle changes in short rules are the low end).
+With 64 permutations in 32 bands of 2 rows, pairs at 0.5 become LSH
+candidates with probability > 0.99.
+
+Usage
+━━━━━
+    from rule_dedup import dedup_rules
+    rules = dedup_rules(final_results)
+
+$ python rule_dedup.py summary.json summary_dedup.json --threshold 0.5
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import re
+import unicodedata
+import zlib
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Set, Tuple
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_STRIP = re.compile(r"[\s、。，．,.\-・:：;；「」『』（）()\[\]【】\"'`]+")
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+DEFAULT_THRESHOLD = 0.5
+DEFAULT_NUM_PERM = 64
+DEFAULT_BANDS = 32
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Shingling / MinHash
+# ────────────────────────────────────────────────────────────────────────────
+
+def _text(rule: Dict, field: str) -> str:
+    """Field as a string; model output sometimes has null (or a number) here."""
+    value = rule.get(field)
+    return value if isinstance(value, str) else "" if value is None else str(value)
+
+
+def rule_text_for_dedup(rule: Dict) -> str:
+    return _text(rule, "rule_text") or _text(rule, "rule_title")
+
+
+def numbers(text: str) -> Tuple[str, ...]:
+    """Numeric tokens (limits, levels, lengths) in order of appearance."""
+    return tuple(_NUMBER.findall(unicodedata.normalize("NFKC", text)))
+
+
+def shingles(text: str, k: int = 3) -> Set[int]:
+    """Hashed character k-grams of the normalized text."""
+    norm = _STRIP.sub("", unicodedata.normalize("NFKC", text).lower())
+    if len(norm) <= k:
+        return {zlib.crc32(norm.encode("utf-8"))} if norm else set()
+    return {zlib.crc32(norm[i:i + k].encode("utf-8")) for i in range(len(norm) - k + 1)}
+
+
+class MinHasher:
+    """MinHash with ``num_perm`` universal hash functions (a*x + b mod p)."""
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self._perms = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+                       for _ in range(num_perm)]
+
+    def signature(self, shingle_set: Set[int]) -> Tuple[int, ...]:
+        if not shingle_set:
+            return tuple([_MAX_HASH] * self.num_perm)
+        return tuple(
+            min(((a * x + b) % _MERSENNE_PRIME) & _MAX_HASH for x in shingle_set)
+            for a, b in self._perms
+        )
+
+
+def lsh_candidates(signatures: List[Tuple[int, ...]], bands: int) -> Set[Tuple[int, int]]:
+    """Index pairs that share at least one identical band."""
+    rows = len(signatures[0]) // bands if signatures else 0
+    pairs: Set[Tuple[int, int]] = set()
+    for band in range(bands):
+        buckets: Dict[Tuple[int, ...], List[int]] = defaultdict(list)
+        for idx, sig in enumerate(signatures):
+            buckets[sig[band * rows:(band + 1) * rows]].append(idx)
+        for members in buckets.values():
+            for i in range(len(members)):
+                for j in range(i + 1, len(members)):
+                    pairs.add((members[i], members[j]))
+    return pairs
+
+
+def jaccard(a: Set[int], b: Set[int]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Clustering / merge
+# ────────────────────────────────────────────────────────────────────────────
+
+def cluster_rules(rules: List[Dict], threshold: float = DEFAULT_THRESHOLD, num_perm: int = DEFAULT_NUM_PERM,
+                  bands: int = DEFAULT_BANDS) -> List[List[int]]:
+    """Return clusters of rule indexes (singletons included), in input order.
+    Rules whose numbers differ are never joined, so clusters cannot mix limits."""
+    texts = [rule_text_for_dedup(r) for r in rules]
+    sets = [frozenset(shingles(t)) for t in texts]
+    nums = [numbers(t) for t in texts]
+
+    parent = list(range(len(rules)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i: int, j: int) -> None:
+        ri, rj = find(i), find(j)
+        if ri != rj:
+            parent[max(ri, rj)] = min(ri, rj)
+
+    # exact duplicates are joined directly; only one representative each goes
+    # through LSH (identical rules would otherwise fill a bucket with n² pairs)
+    first: Dict[Tuple, int] = {}
+    for i, key in enumerate(zip(sets, nums)):
+        if key in first:
+            union(first[key], i)
+        else:
+            first[key] = i
+    reps = sorted(first.values())
+
+    hasher = MinHasher(num_perm)
+    signatures = [hasher.signature(sets[i]) for i in reps]
+    for a, b in lsh_candidates(signatures, bands):
+        i, j = reps[a], reps[b]
+        if nums[i] == nums[j] and jaccard(sets[i], sets[j]) >= threshold:
+            union(i, j)
+
+    clusters: Dict[int, List[int]] = defaultdict(list)
+    for i in range(len(rules)):
+        clusters[find(i)].append(i)
+    return [clusters[root] for root in sorted(clusters)]
+
+
+def _as_list(value) -> List:
+    if value is None:
+        return []
+    return list(value) if isinstance(value, (list, tuple, set)) else [value]
+
+
+def merge_cluster(members: Iterable[Dict]) -> Dict:
+    """Canonical rule = longest rule_text; provenance merged from every member."""
+    members = list(members)
+    canonical = dict(max(members, key=lambda r: len(_text(r, "rule_text"))))
+    if not canonical.get("example"):
+        canonical["example"] = max((_text(r, "example") for r in members), key=len)
+
+    batches, pages = set(), set()
+    for r in members:
+        batches.update(_as_list(r.get("source_batches", r.get("source_batch"))))
+        pages.update(_as_list(r.get("source_pages", r.get("page"))))
+    canonical.pop("source_batch", None)
+    canonical["source_batches"] = sorted(batches)
+    canonical["source_pages"] = sorted(pages)
+    for field, key in (("rule_title", "merged_titles"), ("rule_text", "merged_texts")):
+        values = [_text(r, field) for r in members] + [v for r in members for v in _as_list(r.get(key))]
+        merged = [v for v in dict.fromkeys(values) if v and v != canonical.get(field)]
+        if merged:
+            canonical[key] = merged
+    canonical["duplicate_count"] = sum(r.get("duplicate_count") or 1 for r in members)
+    return canonical
+
+
+def dedup_rules(rules: List[Dict], threshold: float = DEFAULT_THRESHOLD, num_perm: int = DEFAULT_NUM_PERM,
+                bands: int = DEFAULT_BANDS) -> List[Dict]:
+    """Merge near-duplicate rules; output keeps the order of first appearance.
+    Items that are not objects (stray model output) are passed through as-is."""
+    if not rules:
+        return []
+    idx = [i for i, r in enumerate(rules) if isinstance(r, dict)]
+    clusters = cluster_rules([rules[i] for i in idx], threshold=threshold, num_perm=num_perm, bands=bands)
+    merged = {idx[c[0]]: merge_cluster(rules[idx[j]] for j in c) for c in clusters}
+    return [merged[i] if i in merged else r for i, r in enumerate(rules)
+            if i in merged or not isinstance(r, dict)]
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# CLI
+# ────────────────────────────────────────────────────────────────────────────
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge near-duplicate extracted rules (MinHash/LSH)")
+    parser.add_argument("input_json", type=Path)
+    parser.add_argument("output_json", type=Path)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Jaccard similarity to merge")
+    parser.add_argument("--num-perm", type=int, default=DEFAULT_NUM_PERM)
+    parser.add_argument("--bands", type=int, default=DEFAULT_BANDS)
+    args = parser.parse_args()
+
+    if args.num_perm % args.bands:
+        parser.error("--num-perm must be divisible by --bands")
+
+    rules = json.loads(args.input_json.read_text(encoding="utf-8"))
+    merged = dedup_rules(rules, args.threshold, args.num_perm, args.bands)
+    args.output_json.write_text(json.dumps(merged, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"[✓] {len(rules)} rules → {len(merged)} after dedup, saved to {args.output_json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,422 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+rule_store.py  ───────────────────────────────────────────────────────────────
+Indexed local store for coding rules (rules.json / rule_extended.json).
+
+The JSON files stay the human-editable format; the store is a SQLite file
+next to them (rules.json → rules.db) that every tool opens instead of
+re-loading and re-rendering the whole JSON on each run.
+
+- stable integer ids: the JSON "id" field, or assigned on import and
+  written back to the JSON file (a duplicate id is an error)
+- indexes on chapter, category and check_id
+- range updates touch only the rows in the range (primary-key scan)
+- version stamps: a store-wide counter bumped by every write, and a
+  per-rule version set to that counter whenever the rule changes —
+  downstream caches can key on either
+- summary / detail / review renderings are precomputed per rule and
+  regenerated only when that rule changes
+
+If the JSON file is edited by hand it is re-imported automatically the next
+time the store is opened via RuleStore.for_json(); rules whose content is
+unchanged keep their version and renderings.
+
+Usage
+━━━━━
+    from rule_store import RuleStore
+
+    store = RuleStore.for_json("rule_extended.json")
+    store.update_range(8, 12, chapter="1.1", category="Instruction")
+    print(store.summary_table())
+    print(store.details(["R008", "R010"]))
+    store.export_json("rule_extended.json")
+
+$ python rule_store.py rule_extended.json --summary
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rules (
+    id           INTEGER PRIMARY KEY,
+    chapter      TEXT,
+    category     TEXT,
+    check_id     TEXT,
+    data         TEXT NOT NULL,
+    version      INTEGER NOT NULL,
+    summary_line TEXT NOT NULL,
+    detail_block TEXT NOT NULL,
+    review_block TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_rules_chapter  ON rules(chapter);
+CREATE INDEX IF NOT EXISTS idx_rules_category ON rules(category);
+CREATE INDEX IF NOT EXISTS idx_rules_check_id ON rules(check_id);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Ids and renderings
+# ────────────────────────────────────────────────────────────────────────────
+
+def rule_label(rule_id: int) -> str:
+    """1 → 'R001' (the id format quoted by the review prompts)."""
+    return f"R{rule_id:03d}"
+
+
+def parse_rule_id(value: Union[str, int]) -> int:
+    """Accept 12, '12' or 'R012' and return 12."""
+    if isinstance(value, int):
+        return value
+    value = value.strip()
+    if value[:1] in ("R", "r"):
+        value = value[1:]
+    return int(value)
+
+
+def render(rule_id: int, rule: Dict) -> Dict[str, str]:
+    """Precomputed text for one rule. Handles both the rules.json layout
+    (summary/content/example) and rule_extended.json (rule_title/rule_text/example)."""
+    label = rule_label(rule_id)
+    summary = rule.get("summary") or rule.get("rule_title", "")
+    content = rule.get("content") or rule.get("rule_text", "")
+    example = rule.get("example", "")
+    return {
+        "summary_line": f"{rule_id}. [{label}] {summary}",
+        "detail_block": f"[{label}]\n【内容】{content}\n【示例】{example}",
+        "review_block": f"[{rule.get('id', rule_id)}] {rule.get('rule_title', summary)}\n"
+                        f"内容: {rule.get('rule_text', content)}\n例: {example}",
+    }
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Store
+# ────────────────────────────────────────────────────────────────────────────
+
+class RuleStore:
+    """SQLite-backed rule store. Safe to share between threads."""
+
+    def __init__(self, db_path: Union[str, Path]):
+        self.db_path = Path(db_path)
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._conn.executescript(SCHEMA)
+        self._summary_cache: Optional[tuple] = None  # (version, text)
+
+    @classmethod
+    def for_json(cls, json_path: Union[str, Path]) -> "RuleStore":
+        """Open the store that mirrors ``json_path``, (re)importing the JSON if it
+        changed since the last import or export."""
+        store = cls(Path(json_path).with_suffix(".db"))
+        store.sync()
+        return store
+
+    def sync(self) -> bool:
+        """Re-import the mirrored JSON file if it changed on disk (one stat call
+        otherwise). Returns True if a re-import happened."""
+        json_path = self.mirror_path
+        if json_path.exists() and self._meta("mirror_stamp") != _file_stamp(json_path):
+            self.import_json(json_path)
+            return True
+        return False
+
+    @property
+    def mirror_path(self) -> Path:
+        """The JSON file this store mirrors (rules.db ↔ rules.json)."""
+        return self.db_path.with_suffix(".json")
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> "RuleStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # ── transactions / versions ───────────────────────────────────────────
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """Group several writes into one transaction and one version bump."""
+        with self._lock:
+            if self._depth == 0:
+                self._conn.execute("BEGIN IMMEDIATE")
+                self._next_version = self.version + 1
+                self._dirty = False
+            self._depth += 1
+            try:
+                yield
+            except BaseException:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._conn.execute("ROLLBACK")
+                raise
+            self._depth -= 1
+            if self._depth == 0:
+                if self._dirty:
+                    self._set_meta("version", str(self._next_version))
+                self._conn.execute("COMMIT")
+
+    @property
+    def version(self) -> int:
+        """Store-wide version; changes whenever any rule changes."""
+        return int(self._meta("version") or 0)
+
+    def rule_version(self, rule_id: Union[str, int]) -> Optional[int]:
+        rows = self._query("SELECT version FROM rules WHERE id = ?", (parse_rule_id(rule_id),))
+        return rows[0]["version"] if rows else None
+
+    def _query(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _meta(self, key: str) -> Optional[str]:
+        rows = self._query("SELECT value FROM meta WHERE key = ?", (key,))
+        return rows[0]["value"] if rows else None
+
+    def _set_meta(self, key: str, value: str) -> None:
+        self._conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES (?, ?)", (key, value))
+
+    # ── writes ────────────────────────────────────────────────────────────
+
+    def _write(self, rule_id: int, rule: Dict) -> None:
+        if _explicit_id(rule) != rule_id:
+            rule = dict(rule, id=str(rule_id))
+        r = render(rule_id, rule)
+        self._dirty = True
+        self._conn.execute(
+            "INSERT OR REPLACE INTO rules(id, chapter, category, check_id, data, version, "
+            "summary_line, detail_block, review_block) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (rule_id, rule.get("chapter"), rule.get("category"), rule.get("check_id"),
+             json.dumps(rule, ensure_ascii=False), self._next_version,
+             r["summary_line"], r["detail_block"], r["review_block"]),
+        )
+
+    def import_json(self, json_path: Union[str, Path]) -> int:
+        """Replace the store contents with the rules in ``json_path``. Ids assigned
+        to rules that had none are written back to the file, so they stay stable
+        across later edits (inserting a rule does not renumber the others)."""
+        json_path = Path(json_path)
+        with self.batch():
+            rules = json.loads(json_path.read_text(encoding="utf-8"))
+            rules, assigned = self._assign_ids(rules)
+            changed = self.import_rules(rules)
+            if assigned:
+                json_path.write_text(json.dumps(rules, ensure_ascii=False, indent=2), encoding="utf-8")
+                print(f"[✓] Assigned ids to {assigned} rule(s) in {json_path}")
+            self._mark_mirror(json_path)
+        return changed
+
+    def _assign_ids(self, rules: List[Dict]) -> Tuple[List[Dict], int]:
+        """Give every rule without a usable id (anything ``parse_rule_id`` accepts:
+        5, "5", "R005") a stable one: the id of a stored rule with identical
+        content if there is one, else the next unused id. Existing ids are kept
+        as written. Returns (rules with ids, number assigned)."""
+        ids = [_explicit_id(r) for r in rules]
+        explicit = {i for i in ids if i is not None}
+        if None not in ids:
+            return rules, 0
+        by_content: Dict[str, List[int]] = {}
+        for row in self._conn.execute("SELECT id, data FROM rules ORDER BY id"):
+            if row["id"] not in explicit:
+                by_content.setdefault(_content_key(json.loads(row["data"])), []).append(row["id"])
+        stored_max = self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM rules").fetchone()[0]
+        next_id = max([stored_max] + list(explicit)) + 1
+        out, assigned = [], 0
+        for rule, rid in zip(rules, ids):
+            if rid is None:
+                same = by_content.get(_content_key(rule))
+                if same:
+                    rid = same.pop(0)
+                else:
+                    rid, next_id = next_id, next_id + 1
+                rule = {"id": str(rid), **{k: v for k, v in rule.items() if k != "id"}}
+                assigned += 1
+            out.append(rule)
+        return out, assigned
+
+    def import_rules(self, rules: List[Dict]) -> int:
+        """Replace the store contents with ``rules``. Rules without a usable id
+        get a stable one (see ``_assign_ids``); a duplicate id raises ValueError.
+        Returns the number of rules added, changed or removed."""
+        changed = 0
+        with self.batch():
+            rules, _ = self._assign_ids(rules)
+            existing = {row["id"]: row["data"] for row in self._conn.execute("SELECT id, data FROM rules")}
+            seen = set()
+            for rule in rules:
+                rid = _explicit_id(rule)
+                if rid in seen:
+                    raise ValueError(f"duplicate rule id {rid} ({rule_label(rid)})")
+                seen.add(rid)
+                data = json.dumps(rule, ensure_ascii=False)
+                if existing.get(rid) != data:
+                    self._write(rid, rule)
+                    changed += 1
+            stale = set(existing) - seen
+            self._conn.executemany("DELETE FROM rules WHERE id = ?", [(i,) for i in stale])
+            changed += len(stale)
+            self._dirty = self._dirty or bool(stale)
+        return changed
+
+    def add(self, rule: Dict) -> int:
+        """Insert a new rule and return its id."""
+        with self.batch():
+            new_id = self._query("SELECT COALESCE(MAX(id), 0) + 1 FROM rules")[0][0]
+            self._write(new_id, rule)
+        return new_id
+
+    def update(self, rule_id: Union[str, int], **fields) -> bool:
+        """Set fields on one rule. Returns False if the id is unknown."""
+        return self.update_range(rule_id, rule_id, **fields) > 0
+
+    def update_range(self, start: Union[str, int], end: Union[str, int], **fields) -> int:
+        """Set fields on every rule with start <= id <= end. Returns rows changed."""
+        changed = 0
+        with self.batch():
+            rows = self._conn.execute(
+                "SELECT id, data FROM rules WHERE id BETWEEN ? AND ?",
+                (parse_rule_id(start), parse_rule_id(end)),
+            ).fetchall()
+            for row in rows:
+                rule = json.loads(row["data"])
+                if all(rule.get(k) == v for k, v in fields.items()):
+                    continue
+                rule.update(fields)
+                self._write(row["id"], rule)
+                changed += 1
+        return changed
+
+    def export_json(self, json_path: Union[str, Path]) -> None:
+        """Write all rules (id order) to ``json_path`` in the original layout.
+        Exporting over the mirrored JSON file does not trigger a re-import."""
+        json_path = Path(json_path)
+        json_path.write_text(json.dumps(self.all(), ensure_ascii=False, indent=2), encoding="utf-8")
+        with self._lock:
+            self._mark_mirror(json_path)
+
+    def _mark_mirror(self, json_path: Path) -> None:
+        if json_path.resolve() == self.mirror_path.resolve():
+            self._set_meta("mirror_stamp", _file_stamp(json_path))
+
+    # ── reads ─────────────────────────────────────────────────────────────
+
+    def __len__(self) -> int:
+        return self._query("SELECT COUNT(*) FROM rules")[0][0]
+
+    def _select(self, where: str = "", params: tuple = ()) -> List[Dict]:
+        rows = self._query(f"SELECT data FROM rules {where} ORDER BY id", params)
+        return [json.loads(r["data"]) for r in rows]
+
+    def all(self) -> List[Dict]:
+        return self._select()
+
+    def get(self, rule_id: Union[str, int]) -> Optional[Dict]:
+        rows = self._select("WHERE id = ?", (parse_rule_id(rule_id),))
+        return rows[0] if rows else None
+
+    def by_chapter(self, chapter: str) -> List[Dict]:
+        return self._select("WHERE chapter IS ?", (chapter,))
+
+    def by_category(self, category: str) -> List[Dict]:
+        return self._select("WHERE category IS ?", (category,))
+
+    def by_check_id(self, check_id: str) -> List[Dict]:
+        return self._select("WHERE check_id IS ?", (check_id,))
+
+    def chapters(self) -> List[str]:
+        """Distinct chapters, in order of first appearance by id."""
+        rows = self._query("SELECT chapter, MIN(id) AS first FROM rules GROUP BY chapter ORDER BY first")
+        return [r["chapter"] for r in rows]
+
+    # ── renderings ────────────────────────────────────────────────────────
+
+    def summary_table(self) -> str:
+        """'1. [R001] …' lines for every rule; rebuilt only after a write."""
+        version = self.version
+        if self._summary_cache is None or self._summary_cache[0] != version:
+            rows = self._query("SELECT summary_line FROM rules ORDER BY id")
+            self._summary_cache = (version, "\n".join(r["summary_line"] for r in rows))
+        return self._summary_cache[1]
+
+    def details(self, rule_ids: Optional[Iterable[Union[str, int]]] = None) -> str:
+        """Detail blocks for the given ids (all rules if None), unknown ids skipped."""
+        if rule_ids is None:
+            rows = self._query("SELECT detail_block FROM rules ORDER BY id")
+            return "\n\n".join(r["detail_block"] for r in rows)
+        blocks = []
+        for rid in rule_ids:
+            try:
+                rows = self._query("SELECT detail_block FROM rules WHERE id = ?", (parse_rule_id(rid),))
+            except ValueError:
+                rows = []
+            if rows:
+                blocks.append(rows[0]["detail_block"])
+        return "\n\n".join(blocks)
+
+    def review_text(self, rule_ids: Iterable[Union[str, int]]) -> str:
+        """check_by_category prompt block ([id] title / 内容 / 例) for the given ids."""
+        blocks = []
+        for rid in rule_ids:
+            rows = self._query("SELECT review_block FROM rules WHERE id = ?", (parse_rule_id(rid),))
+            if rows:
+                blocks.append(rows[0]["review_block"])
+        return "\n\n".join(blocks)
+
+
+def _explicit_id(rule: Dict) -> Optional[int]:
+    """The rule's id as an int, or None if it has none ``parse_rule_id`` accepts."""
+    value = rule.get("id")
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return parse_rule_id(value)
+    except (ValueError, AttributeError):
+        return None
+
+
+def _content_key(rule: Dict) -> str:
+    return json.dumps({k: v for k, v in rule.items() if k != "id"}, ensure_ascii=False, sort_keys=True)
+
+
+def _file_stamp(path: Path) -> str:
+    st = path.stat()
+    return f"{st.st_mtime_ns}:{st.st_size}"
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# CLI
+# ────────────────────────────────────────────────────────────────────────────
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or sync the rule store for a rules JSON file")
+    parser.add_argument("rule_json", type=Path)
+    parser.add_argument("--summary", action="store_true", help="print the summary table")
+    parser.add_argument("--export", type=Path, help="write the store back out as JSON")
+    args = parser.parse_args()
+
+    store = RuleStore.for_json(args.rule_json)
+    print(f"[✓] {store.db_path}: {len(store)} rules, version {store.version}")
+    if args.summary:
+        print(store.summary_table())
+    if args.export:
+        store.export_json(args.export)
+        print(f"[✓] Exported to {args.export}")
+
+
+if __name__ == "__main__":
+    main()